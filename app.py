@@ -1,5 +1,8 @@
 import os
+import time
+from datetime import datetime, timedelta
 
+import click
 import pytz
 import logging
 from flask import Flask, request, session, redirect, url_for, g, jsonify, render_template
@@ -12,7 +15,6 @@ from src.functions.api.api import api_bp
 from src.functions.config.config import get_config, initialize_database
 from src.functions.config.config_example import generate_config_example
 from src.functions.config.site_settings import load_site_settings
-from src.functions.database.models import User, Post, Comment
 from src.functions.icenter.db_operation import execute_sql_logic
 from src.functions.icenter.icenter_index_page import icenter_index
 from src.functions.icenter.icenter_login import icenter_login_logic
@@ -20,13 +22,25 @@ from src.functions.icenter.index_logic_for_icenter import return_icenter_index_t
     return_icenter_execute_sql_templates, return_icenter_editor
 from src.functions.index import index_logic, newest_logic, global_logic
 from src.functions.moderation.moderation import moderation_bp
-from src.functions.parser.markdown_parser import remove_markdown
+from src.functions.parser.markdown_parser import remove_markdown, render_cache
 from src.functions.section.section import section_bp
+from src.functions.section.section_counts import reconcile_section_counts
+from src.functions.section.section_stats import backfill_daily_stats, rebuild_daily_stats
 from src.functions.service import monitor
 from src.functions.service.editor import editor_tool
+from src.functions.service.forum_stats import forum_stats
 from src.functions.service.intstall import install_logic
+from src.functions.service.install_state import install_state
+from src.functions.service.markdown_maintenance import strip_stored_assets, rerender_stored_html, backfill_excerpts
+from src.functions.service.presence import presence_tracker
 from src.functions.service.post_logic import create_post_logic, view_post_logic
+from src.functions.service.render_queue import render_queue
 from src.functions.service.search_bp import search_bp
+from src.functions.service.search_cache import search_cache
+from src.functions.service.search_index import rebuild_search_index, ensure_search_index
+from src.functions.service.search_suggest import search_suggester
+from src.functions.service.search_tokenizer import set_tokenizer
+from src.functions.service.user_cache import user_cache, force_db_user
 from src.functions.service.user_logic import register_logic, login_logic, logout_logic
 from src.functions.service.user_operations import reply_logic, like_post_logic, \
     like_comment_logic, upgrade_user_logic, downgrade_user_logic, edit_post_logic, \
@@ -79,6 +93,20 @@ app.config["FOOTER_ENABLED"] = site_settings.get("footer_enabled", False)
 db.init_app(app)
 csrf = CSRFProtect(app)
 
+# 在线用户统计
+presence_tracker.configure(config.get('presence', {}))
+
+# 登录用户缓存
+user_cache.configure(config.get('user_cache', {}))
+
+# 安装状态（启动时确定，安装完成后通过 instance 目录下的标记文件同步到其他进程）
+install_state.init_app(app)
+
+# 搜索分词器、结果缓存和联想
+set_tokenizer(config.get('search', {}).get('tokenizer', 'cjk_bigram'))
+search_cache.configure(config.get('search', {}).get('cache', {}))
+search_suggester.configure(config.get('search', {}).get('suggest', {}))
+
 # 注册API蓝图
 app.register_blueprint(api_bp, url_prefix='/api')
 
@@ -103,6 +131,12 @@ app.register_blueprint(privacy_bp)
 # 注册 markdown 渲染蓝图
 app.jinja_env.globals.update(remove_markdown=remove_markdown)
 
+# Markdown 渲染缓存
+render_cache.configure(config.get('markdown', {}).get('render_cache', {}))
+
+# 长帖子的异步渲染队列
+render_queue.init_app(app, config.get('markdown', {}).get('async_render', {}))
+
 # 初始化页脚功能
 init_footer(app)
 
@@ -115,15 +149,73 @@ with app.app_context():
     scheduler.start()
 
 
+def enqueue_pending_renders():
+    # 补偿进程重启等原因丢失的渲染任务
+    with app.app_context():
+        render_queue.enqueue_pending()
+
+
+if render_queue.enabled:
+    scheduler.add_job(
+        id='enqueue_pending_renders',
+        func=enqueue_pending_renders,
+        trigger='interval',
+        minutes=1
+    )
+
+
+def reconcile_forum_stats():
+    # 校准批量修改等未经过 ORM 事件的数据变化
+    with app.app_context():
+        forum_stats.refresh()
+
+
+scheduler.add_job(
+    id='reconcile_forum_stats',
+    func=reconcile_forum_stats,
+    trigger='interval',
+    minutes=config.get('forum_stats', {}).get('reconcile_minutes', 10)
+)
+
+
+def reconcile_sections():
+    # 重新统计板块的帖子数和回复数
+    with app.app_context():
+        reconcile_section_counts()
+
+
+scheduler.add_job(
+    id='reconcile_section_counts',
+    func=reconcile_sections,
+    trigger='interval',
+    minutes=config.get('forum_stats', {}).get('section_reconcile_minutes', 60)
+)
+
+
+def backfill_section_stats():
+    # 首次运行时生成全部历史的板块每日汇总，之后重新生成最近几天以校准偏差
+    with app.app_context():
+        backfill_daily_stats(config.get('forum_stats', {}).get('daily_stats_recent_days', 3))
+
+
+scheduler.add_job(
+    id='backfill_section_stats',
+    func=backfill_section_stats,
+    trigger='interval',
+    minutes=config.get('forum_stats', {}).get('daily_stats_minutes', 60)
+)
+
+
 # 注册一些小功能
 @app.before_request
 def before_request():
     if 'user_id' not in session:
-        if request.endpoint not in ['install', 'static'] and User.query.count() == 0:
+        if request.endpoint not in ['install', 'static'] and not install_state.installed:
             return redirect(url_for('install'))
 
     if 'user_id' in session:
-        user = db.session.get(User, session['user_id'])
+        # 使用缓存的用户快照，命中时不查询数据库
+        user = user_cache.get(session['user_id'])
         if user:
             g.user = user
             request.user = user  # 将用户信息附加到 request 对象上
@@ -141,32 +233,19 @@ def before_request():
     user_agent = request.headers.get('User-Agent', 'Unknown')
     g.user_agent = user_agent
 
+    # 记录在线状态（静态文件请求不计入）
+    if request.endpoint != 'static':
+        presence_tracker.touch(g.user, request.remote_addr, user_agent)
+
 @app.context_processor
 def inject_forum_stats():
-    forum_stats = {
-        'topics': Post.query.filter_by(deleted=False).count(),
-        'messages': Comment.query.filter_by(deleted=False).count(),
-        'users': User.query.count(),
-        'latest_user': User.query.order_by(User.id.desc()).first().username if User.query.count() > 0 else "暂无用户"
-    }
-    return {'forum_stats': forum_stats}
+    # 统计数据保存在内存中并由模型事件增量更新，渲染页面时不查询数据库
+    return {'forum_stats': forum_stats.get()}
 
 @app.context_processor
 def inject_online_users():
-    online_users = {
-        'total': 0,
-        'users': 0,
-        'guests': 0,
-        'users_list': []
-    }
-    if g.user:
-        online_users['total'] += 1
-        online_users['users'] += 1
-        online_users['users_list'].append({'user_uid': g.user.user_uid, 'username': g.user.username})
-    else:
-        online_users['total'] += 1
-        online_users['guests'] += 1
-    return {'online_users': online_users}
+    # 最近几分钟内访问过的用户和游客，汇总结果缓存几秒
+    return {'online_users': presence_tracker.snapshot()}
 """
 路由部分
 """
@@ -216,14 +295,17 @@ def like_comment(comment_id):
     return like_comment_logic(comment_id)
 
 @app.route('/upgrade_user/<int:user_id>')
+@force_db_user
 def upgrade_user(user_id):
     return upgrade_user_logic(user_id)
 
 @app.route('/downgrade_user/<int:user_id>')
+@force_db_user
 def downgrade_user(user_id):
     return downgrade_user_logic(user_id)
 
 @app.route('/edit_post/<int:post_id>', methods=['GET', 'POST'])
+@force_db_user
 def edit_post(post_id):
     return edit_post_logic(post_id)
 
@@ -320,6 +402,51 @@ def internal_server_error(e):
 def reply(front_end_reply_messsage, reply_to_users_id):
     return reply_logic(front_end_reply_messsage, reply_to_users_id)
 
+"""
+命令行维护命令
+"""
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """重建搜索倒排索引"""
+    indexed = rebuild_search_index()
+    print(f"搜索索引重建完成，共索引 {indexed} 条帖子和评论")
+
+@app.cli.command('strip-markdown-assets')
+@click.option('--batch-size', default=500, show_default=True, help='每批处理的行数')
+def strip_markdown_assets_command(batch_size):
+    """清理旧版本渲染时注入到 html_content 中的脚本和样式"""
+    stripped = strip_stored_assets(batch_size)
+    print(f"清理完成：帖子 {stripped['post']} 条，评论 {stripped['comment']} 条")
+
+@app.cli.command('backfill-excerpts')
+@click.option('--batch-size', default=500, show_default=True, help='每批处理的行数')
+def backfill_excerpts_command(batch_size):
+    """为旧帖子生成列表摘要"""
+    filled = backfill_excerpts(batch_size)
+    print(f"摘要生成完成，共 {filled} 条帖子")
+
+@app.cli.command('rebuild-section-stats')
+@click.option('--days', default=None, type=int, help='只重新生成最近几天，默认全部历史')
+def rebuild_section_stats_command(days):
+    """重新生成板块每日汇总"""
+    start = datetime.utcnow().date() - timedelta(days=days - 1) if days else None
+    rebuild_daily_stats(start=start)
+    print("板块每日汇总生成完成")
+
+@app.cli.command('rerender-markdown')
+@click.option('--batch-size', default=500, show_default=True, help='每批渲染的行数')
+@click.option('--workers', default=None, type=int, help='渲染进程数，默认为 CPU 核数')
+@click.option('--restart', is_flag=True, help='忽略检查点，从头开始')
+def rerender_markdown_command(batch_size, workers, restart):
+    """用当前解析器重新渲染所有帖子和评论的 html_content"""
+    started = time.monotonic()
+    summary = rerender_stored_html(batch_size, workers, restart=restart)
+    processed = sum(count for count, _ in summary.values())
+    elapsed = time.monotonic() - started
+    print(f"重新渲染完成：帖子 {summary['post'][0]} 行（更新 {summary['post'][1]} 行），"
+          f"评论 {summary['comment'][0]} 行（更新 {summary['comment'][1]} 行），"
+          f"耗时 {elapsed:.1f} 秒，{processed / elapsed if elapsed else 0:.0f} 行/秒")
+
 if __name__ == '__main__':
     # 初始化日志
     log_path = "./logs"
@@ -328,6 +455,15 @@ if __name__ == '__main__':
 
     # 初始化数据库
     initialize_database(app)
+    with app.app_context():
+        ensure_search_index()
+        # 摘要列加入之前发布的帖子
+        backfill_excerpts()
+        install_state.load()
+        # 板块计数改为增量维护之前，计数只在访问板块列表时更新
+        reconcile_section_counts()
+    # 数据库就绪后在后台生成板块每日汇总，不阻塞启动
+    scheduler.add_job(id='backfill_section_stats_on_startup', func=backfill_section_stats, trigger='date')
 
     # 从配置中获取日志设置
     config = get_config()
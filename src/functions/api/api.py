@@ -11,7 +11,7 @@ from src.functions.service.user_routes import calculate_contributions
 from src.db_ext import db
 from src.functions.database.models import Post, Comment, Report, Like, Section, UserFollowerCount, \
     UserFollowRelation, UserFollowingCount, ReplyComment, User
-from src.functions.parser.markdown_parser import convert_markdown_to_html
+from src.functions.service.render_queue import render_queue
 from src.functions.service.user_operations import reply_logic
 
 # 创建一个API蓝图
@@ -143,10 +143,12 @@ def create_post():
     # 确保用户已登录
     if not request.user:
         return jsonify({'message': 'Unauthorized'}), 401
+    html_content, render_state = render_queue.render(data['content'])
     new_post = Post(
         title=data['title'],
         content=data['content'],
-        html_content=convert_markdown_to_html(data['content']),
+        html_content=html_content,
+        render_state=render_state,
         author_id=request.user.id
     )
     db.session.add(new_post)
@@ -211,9 +213,11 @@ def create_comment(post_id):
     data = request.get_json()
     if not data or 'content' not in data:
         return jsonify({'message': 'Invalid data'}), 400
+    html_content, render_state = render_queue.render(data['content'])
     new_comment = Comment(
         content=data['content'],
-        html_content=convert_markdown_to_html(data['content']),
+        html_content=html_content,
+        render_state=render_state,
         author_id=request.user.id,
         post_id=post_id
     )
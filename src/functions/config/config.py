@@ -1,6 +1,7 @@
 import os
 import yaml
 from src.db_ext import db
+from src.functions.database.migrations import upgrade_schema, create_missing_indexes
 
 def ensure_config_directory():
     config_dir = 'config'
@@ -37,6 +38,47 @@ csrf:
   enabled: True # 默认开启
   ssl_strict: True # 默认开启
 
+# 搜索配置
+search:
+  tokenizer: cjk_bigram # 分词器，可选：cjk_bigram（中日韩文字按二元组切分）或 word（按单词切分），修改后启动时自动重建索引
+  cache:
+    backend: memory # 搜索结果缓存后端，可选：memory（进程内）或 sqlite（多进程共享）
+    max_size: 256 # 最多缓存的关键词数量
+    ttl: 300 # 缓存有效期（秒）
+    path: 'instance/search_cache.db' # sqlite 后端的缓存文件路径
+  suggest:
+    refresh_seconds: 60 # 搜索联想的刷新间隔（秒），其他进程的修改最多延迟这么久出现在联想中
+
+# Markdown 渲染配置
+markdown:
+  render_cache:
+    max_bytes: 33554432 # 内存中渲染缓存的最大容量（字节）
+    directory: 'instance/render_cache' # 渲染缓存持久化目录，留空则只缓存在内存中
+    max_disk_bytes: 268435456 # 磁盘上渲染缓存的最大容量（字节），超出后删除最久未访问的文件
+  async_render:
+    enabled: False # 是否在后台渲染长帖子，渲染完成前显示转义后的原文
+    threshold: 20000 # 内容长度（字符）达到该值时使用后台渲染
+    workers: 2 # 后台渲染线程数
+
+# 在线用户统计
+presence:
+  window_minutes: 5 # 最近多少分钟内访问过视为在线
+  cache_seconds: 5 # 在线人数汇总结果的缓存时间（秒）
+  backend: memory # 可选：memory（进程内）或 sqlite（多进程共享）
+  path: 'instance/presence.db' # sqlite 后端的文件路径
+
+# 登录用户缓存
+user_cache:
+  max_size: 1024 # 每个进程最多缓存的用户数
+  ttl: 60 # 缓存有效期（秒），角色修改在其他进程中最多延迟这么久生效（管理操作总是读取数据库）
+
+# 论坛统计（主题数、消息数、用户数）
+forum_stats:
+  reconcile_minutes: 10 # 重新统计以校准内存中计数的间隔（分钟）
+  section_reconcile_minutes: 60 # 重新统计板块帖子数和回复数的间隔（分钟）
+  daily_stats_minutes: 60 # 校准板块每日汇总（板块分析页）的间隔（分钟）
+  daily_stats_recent_days: 3 # 每次校准重新生成最近几天的汇总
+
 # 日志配置
 log:
   level: INFO # 日志级别，可选：DEBUG, INFO, WARNING, ERROR, CRITICAL
@@ -57,4 +99,6 @@ log:
 
 def initialize_database(app):
     with app.app_context():
-        db.create_all()
\ No newline at end of file
+        db.create_all()
+        upgrade_schema(db.engine)
+        create_missing_indexes(db.engine, db.metadata)
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""
+轻量的数据库结构升级
+db.create_all() 只会创建缺失的表，已有表新增的列在这里用 ALTER TABLE ADD COLUMN 补上，
+模型中新声明的索引用 CREATE INDEX 补上
+"""
+from sqlalchemy import inspect, text
+
+# (表名, 列名, 列定义)，新增列必须可为空或带有默认值
+ADDED_COLUMNS = [
+    ('post', 'render_state', "VARCHAR(16) NOT NULL DEFAULT 'done'"),
+    ('comment', 'render_state', "VARCHAR(16) NOT NULL DEFAULT 'done'"),
+    ('post', 'excerpt', 'TEXT'),
+]
+
+
+def upgrade_schema(engine):
+    """补齐旧数据库中缺失的列，返回新增的 表.列 列表"""
+    inspector = inspect(engine)
+    existing = {}
+    added = []
+    with engine.begin() as connection:
+        for table, column, definition in ADDED_COLUMNS:
+            if not inspector.has_table(table):
+                continue
+            if table not in existing:
+                existing[table] = {info['name'] for info in inspector.get_columns(table)}
+            if column not in existing[table]:
+                connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {definition}'))
+                existing[table].add(column)
+                added.append(f'{table}.{column}')
+    return added
+
+
+def create_missing_indexes(engine, metadata):
+    """为已有的表创建模型中声明但数据库中还没有的索引，返回新建的索引名列表"""
+    inspector = inspect(engine)
+    created = []
+    for table in metadata.sorted_tables:
+        if not table.indexes or not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                index.create(engine)
+                created.append(index.name)
+    return created
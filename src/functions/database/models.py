@@ -2,7 +2,10 @@
 
 from datetime import datetime
 
+from sqlalchemy.orm import validates
+
 from src.db_ext import db
+from src.functions.parser.markdown_parser import make_excerpt
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -23,6 +26,15 @@ class User(db.Model):
     )
 
 class Post(db.Model):
+    # 列表、板块和个人主页都只查询未删除的帖子，使用 deleted = 0 的部分索引，排序列与各自的 ORDER BY 一致
+    __table_args__ = (
+        db.Index('ix_post_live_created', 'created_at', 'id', sqlite_where=db.text('deleted = 0')),
+        db.Index('ix_post_live_likes', 'like_count', 'created_at', 'id', sqlite_where=db.text('deleted = 0')),
+        db.Index('ix_post_section_live_created', 'section_id', 'created_at', 'id', sqlite_where=db.text('deleted = 0')),
+        db.Index('ix_post_section_live_likes', 'section_id', 'like_count', 'created_at', 'id',
+                 sqlite_where=db.text('deleted = 0')),
+        db.Index('ix_post_author_created', 'author_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     content = db.Column(db.Text, nullable=False)
@@ -43,8 +55,18 @@ class Post(db.Model):
     section_id = db.Column(db.Integer, db.ForeignKey('section.id'), nullable=False)
     section = db.relationship('Section', backref=db.backref('posts', lazy=True))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    render_state = db.Column(db.String(16), nullable=False, default='done', server_default='done')  # done / rendering
+    excerpt = db.Column(db.Text)  # 列表页显示的纯文本摘要，随 content 一起更新
+
+    @validates('content')
+    def update_excerpt(self, key, content):
+        self.excerpt = make_excerpt(content or '')
+        return content
 
 class ReplyComment(db.Model):
+    __table_args__ = (
+        db.Index('ix_reply_comment_target', 'target_comment_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     reply_message = db.Column(db.Text, nullable=False)
     reply_user = db.Column(db.Text, nullable=False)
@@ -61,6 +83,10 @@ class ReplyComment(db.Model):
     like_count = db.Column(db.Integer, default=0)  # 添加 like_count 属性
 
 class Comment(db.Model):
+    __table_args__ = (
+        db.Index('ix_comment_post_deleted', 'post_id', 'deleted'),
+        db.Index('ix_comment_author', 'author_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     html_content = db.Column(db.Text, nullable=False)
@@ -77,8 +103,15 @@ class Comment(db.Model):
     like_count = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     target_comment_id = db.Column(db.Integer, db.ForeignKey('comment.id'), nullable=True)
+    render_state = db.Column(db.String(16), nullable=False, default='done', server_default='done')  # done / rendering
 
 class Report(db.Model):
+    __table_args__ = (
+        db.Index('ix_report_status_created', 'status', 'created_at'),
+        # 删除帖子、评论（包括批量删除板块）时按目标清理举报
+        db.Index('ix_report_post', 'post_id'),
+        db.Index('ix_report_comment', 'comment_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=True)
     comment_id = db.Column(db.Integer, db.ForeignKey('comment.id'), nullable=True)
@@ -112,6 +145,11 @@ class Like(db.Model):
             '(post_id IS NOT NULL AND comment_id IS NULL) OR (post_id IS NULL AND comment_id IS NOT NULL)',
             name='check_like_target'
         ),
+        db.Index('ix_like_user_post', 'user_id', 'post_id'),
+        db.Index('ix_like_user_comment', 'user_id', 'comment_id'),
+        # 删除帖子、评论（包括批量删除板块）时按目标清理点赞
+        db.Index('ix_like_post', 'post_id'),
+        db.Index('ix_like_comment', 'comment_id'),
     )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -127,12 +165,32 @@ class Section(db.Model):
     post_count = db.Column(db.Integer, default=0)
     comment_count = db.Column(db.Integer, default=0)
 
+class SectionDailyStat(db.Model):
+    """板块每日汇总（按 UTC 日期）：发帖数、回复数、活跃作者数，随帖子和评论的增删增量维护"""
+    __table_args__ = (
+        db.Index('ix_section_daily_stat_day', 'day'),
+    )
+    section_id = db.Column(db.Integer, db.ForeignKey('section.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    post_count = db.Column(db.Integer, nullable=False, default=0)
+    comment_count = db.Column(db.Integer, nullable=False, default=0)
+    author_count = db.Column(db.Integer, nullable=False, default=0)
+
+class SectionAuthorDailyStat(db.Model):
+    """每位作者在板块中每日的发帖数和回复数，用于活跃用户排行和 SectionDailyStat.author_count"""
+    section_id = db.Column(db.Integer, db.ForeignKey('section.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    post_count = db.Column(db.Integer, nullable=False, default=0)
+    comment_count = db.Column(db.Integer, nullable=False, default=0)
+
 class UserContribution(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_uid = db.Column(db.Integer, db.ForeignKey('user.user_uid'), nullable=False)
     date = db.Column(db.Date, nullable=False)
     contribution_value = db.Column(db.Integer, nullable=False)
 
+    # 唯一约束自带 (user_uid, date) 索引，按用户查询贡献时直接使用
     __table_args__ = (
         db.UniqueConstraint('user_uid', 'date', name='_user_uid_date_uc'),
     )
@@ -165,4 +223,33 @@ class UserFollowerCount(db.Model):
 class UserFollowingCount(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_user_uid = db.Column(db.Integer, db.ForeignKey('user.user_uid'), unique=True, nullable=False)
-    following_count = db.Column(db.Integer, default=0)
\ No newline at end of file
+    following_count = db.Column(db.Integer, default=0)
+
+class SearchDocument(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    field = db.Column(db.String(20), nullable=False)  # post_title, post_content, post_author, comment_content, comment_author
+    source_id = db.Column(db.Integer, nullable=False)  # 帖子或评论的 ID
+    post_id = db.Column(db.Integer, nullable=False)
+    comment_id = db.Column(db.Integer, nullable=True)
+    preview = db.Column(db.Text)
+    tokens = db.Column(db.Text)  # 写入时预先分好的词元，以空格分隔
+    length = db.Column(db.Integer, default=0)  # 词元数量，用于 BM25 长度归一化
+
+    __table_args__ = (
+        db.UniqueConstraint('field', 'source_id', name='_search_field_source_uc'),
+        db.Index('ix_search_document_post', 'post_id'),  # 删除帖子时连同评论的文档一起清理
+    )
+
+class SearchPosting(db.Model):
+    term = db.Column(db.String(64), primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('search_document.id', ondelete='CASCADE'), primary_key=True, index=True)
+    tf = db.Column(db.Integer, nullable=False)
+
+class SearchFieldStat(db.Model):
+    field = db.Column(db.String(20), primary_key=True)
+    doc_count = db.Column(db.Integer, default=0)
+    total_length = db.Column(db.Integer, default=0)
+
+class SearchIndexMeta(db.Model):
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(100))
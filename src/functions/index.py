@@ -2,42 +2,59 @@
 根目录
 """
 from flask import render_template, request, redirect, url_for
+from sqlalchemy.orm import load_only, joinedload
 
 from src.functions.other.loader_wrapper import should_show_loader
-from src.functions.database.models import Post
+from src.functions.database.models import Post, User, Section
+from src.functions.post_listing import post_count_key
+from src.functions.utils.pagination import keyset_paginate, count_cache
+
+PER_PAGE = 10
+
+# 排序方式 -> 键集分页的排序列（均为降序，最后一列为主键保证顺序唯一）
+SORT_COLUMNS = {
+    'timeline': (Post.created_at, Post.id),
+    'global': (Post.like_count, Post.created_at, Post.id)
+}
+
+
+def post_listing_query(**filters):
+    """
+    帖子列表查询：只加载卡片用到的列，不读取正文和渲染后的 HTML；
+    作者和板块在同一条查询中联表加载，每页的 SQL 数量与每页条数无关
+    """
+    return Post.query.filter_by(deleted=False, **filters).options(
+        load_only(Post.id, Post.title, Post.excerpt, Post.author_id, Post.section_id, Post.like_count,
+                  Post.look_count, Post.created_at, Post.deleted),
+        joinedload(Post.author).load_only(User.id, User.username),
+        joinedload(Post.section).load_only(Section.id, Section.name)
+    )
 
 def index_logic():
     return redirect(url_for('newest'))  # 默认重定向到时间线排序页面
 
-def newest_logic():
-    page = request.args.get('page', 1, type=int)
-    per_page = 10
-
-    # 按时间线排序（最先发布的在前）
-    posts = Post.query.filter_by(deleted=False).order_by(
-        Post.created_at.desc()  # 按发布时间升序
-    ).paginate(
-        page=page,
-        per_page=per_page,
-        error_out=False
+def paginate_posts(sort, **filters):
+    """按排序方式对帖子列表做键集分页，总数使用缓存"""
+    posts = keyset_paginate(
+        post_listing_query(**filters), sort, SORT_COLUMNS[sort],
+        cursor=request.args.get('cursor'), per_page=PER_PAGE
+    )
+    posts.total = count_cache.get(
+        post_count_key(**filters),
+        lambda: Post.query.filter_by(deleted=False, **filters).count()
     )
+    return posts
+
+def newest_logic():
+    # 按时间线排序（最新发布的在前）
+    posts = paginate_posts('timeline')
 
     loader_wrapper = should_show_loader()
     return render_template('index.html', posts=posts, sort='timeline', loader_wrapper=loader_wrapper)
 
 def global_logic():
-    page = request.args.get('page', 1, type=int)
-    per_page = 10
-
-    # 按点赞数量排序（点赞最多的在前）
-    posts = Post.query.filter_by(deleted=False).order_by(
-        Post.like_count.desc(),  # 按点赞数量降序
-        Post.created_at.desc()   # 点赞数量相同的情况下按时间降序
-    ).paginate(
-        page=page,
-        per_page=per_page,
-        error_out=False
-    )
+    # 按点赞数量排序（点赞最多的在前），点赞数量相同的情况下按时间降序
+    posts = paginate_posts('global')
 
     loader_wrapper = should_show_loader()
-    return render_template('index.html', posts=posts, sort='global', loader_wrapper=loader_wrapper)
\ No newline at end of file
+    return render_template('index.html', posts=posts, sort='global', loader_wrapper=loader_wrapper)
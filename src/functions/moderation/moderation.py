@@ -4,6 +4,7 @@ from flask import Blueprint, g, jsonify, request, abort, render_template
 from sqlalchemy.orm import joinedload
 
 from src.functions.database.models import Report, Post, Comment, db
+from src.functions.service.user_cache import force_db_user
 
 moderation_bp = Blueprint('moderation', __name__)
 
@@ -45,6 +46,7 @@ def moderation_reports_processed():
 
 
 @moderation_bp.route('/handle_report/<int:report_id>', methods=['POST'])
+@force_db_user
 def handle_report(report_id):
     if g.role not in ['admin', 'moderator']:
         abort(403)
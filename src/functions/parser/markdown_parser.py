@@ -1,308 +1,465 @@
+import hashlib
+import os
 import re
+import shutil
+import threading
+from collections import OrderedDict
 
 import bleach
 from bleach.css_sanitizer import CSSSanitizer
-from bs4 import BeautifulSoup
-from markdown import markdown
+from bleach.html5lib_shim import Filter
+from markdown import Markdown
+
+# 解析器版本，修改渲染结果（标签、样式、嵌入白名单等）时需要递增，旧的渲染缓存随之失效
+PARSER_VERSION = 3
+
+
+class RenderCache:
+    """
+    以 “解析器版本 + 源文本” 的哈希为键的渲染缓存
+    内存中按 LRU 淘汰并限制总大小，可选持久化到磁盘目录（按解析器版本分目录存放）；
+    磁盘缓存超过 max_disk_bytes 时按最近访问时间删除最旧的文件，直到降到上限的 90%
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, directory=None, max_disk_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.directory = None
+        self._entries = OrderedDict()
+        self._size = 0
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            self.set_directory(directory)
+
+    def configure(self, cache_config):
+        self.max_bytes = cache_config.get('max_bytes', self.max_bytes)
+        self.max_disk_bytes = cache_config.get('max_disk_bytes', self.max_disk_bytes)
+        self.set_directory(cache_config.get('directory'))
+        self.clear()
+
+    def set_directory(self, directory):
+        self.directory = None
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        # 清理旧版本解析器留下的缓存目录
+        current = f'v{PARSER_VERSION}'
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name != current and name.startswith('v') and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+        self.directory = os.path.join(directory, current)
+        os.makedirs(self.directory, exist_ok=True)
+        self._disk_size = sum(size for _, _, size in self._disk_files())
+
+    @staticmethod
+    def key(markdown_text):
+        return hashlib.sha256(f'{PARSER_VERSION}\0{markdown_text}'.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.html')
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        if self.directory:
+            try:
+                with open(self._path(key), 'r', encoding='utf-8') as f:
+                    html = f.read()
+            except OSError:
+                html = None
+            if html is not None:
+                self._remember(key, html)
+                with self._lock:
+                    self.hits += 1
+                try:
+                    # 更新访问时间，磁盘淘汰按最近访问的先后进行
+                    os.utime(self._path(key))
+                except OSError:
+                    pass
+                return html
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, html):
+        self._remember(key, html)
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(html)
+                os.replace(temp_path, path)
+            except OSError:
+                return
+            with self._lock:
+                self._disk_size += len(html.encode('utf-8'))
+                over_limit = self._disk_size > self.max_disk_bytes
+            if over_limit:
+                self._prune_disk()
+
+    def _disk_files(self):
+        """磁盘缓存中的全部文件，返回 [(修改时间, 路径, 大小)]"""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, path, stat.st_size))
+        return files
+
+    def _prune_disk(self):
+        """
+        重新扫描目录得到实际大小（多个进程共用同一目录，各自的计数并不准确），
+        按修改时间从旧到新删除文件，直到降到上限的 90%
+        """
+        files = sorted(self._disk_files())
+        total = sum(size for _, _, size in files)
+        target = self.max_disk_bytes * 0.9
+        for _, path, size in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        with self._lock:
+            self._disk_size = total
+
+    def _remember(self, key, html):
+        # 按 UTF-8 编码后的字节数计算，中文内容每个字符占 3 个字节
+        size = len(html.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (html, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+render_cache = RenderCache()
 
 
 def convert_markdown_to_html(markdown_text):
-    # 更新告示（banner）组件的正则表达式，避免 ReDoS 攻击
-    banner_patterns = {
-        'tip': r':::tip\s+([^\n]+?)\s*:::',
-        'warning': r':::warning\s+([^\n]+?)\s*:::',
-        'caution': r':::caution\s+([^\n]+?)\s*:::',
-        'danger': r':::danger\s+([^\n]+?)\s*:::',
-        'check': r':::check\s+([^\n]+?)\s*:::',
-        'info': r':::info\s+([^\n]+?)\s*:::',
-        'note': r':::note\s+([^\n]+?)\s*:::'
-    }
-
-    # 定义每种告示类型对应的 Font 图标（可根据需要调整）
-    banner_icons = {
-        'tip': 'fa-lightbulb',
-        'warning': 'fa-exclamation-triangle',
-        'caution': 'fa-triangle-exclamation',
-        'danger': 'fa-skull',
-        'check': 'fa-check-circle',
-        'info': 'fa-circle-info',
-        'note': 'fa-book'
-    }
-
-    # 定义告示类型对应的颜色方案
-    banner_colors = {
-        'tip': {'bg': '#d4edda', 'border': '#155724', 'text': '#155724', 'title': '提示'},
-        'warning': {'bg': '#fff3cd', 'border': '#856404', 'text': '#856404', 'title': '警告'},
-        'caution': {'bg': '#fff3cd', 'border': '#856404', 'text': '#856404', 'title': '注意'},
-        'danger': {'bg': '#f8d7da', 'border': '#721c24', 'text': '#721c24', 'title': '危险'},
-        'check': {'bg': '#d4edda', 'border': '#155724', 'text': '#155724', 'title': '检查'},
-        'info': {'bg': '#d1ecf1', 'border': '#0c5460', 'text': '#0c5460', 'title': '信息'},
-        'note': {'bg': '#e2e3e5', 'border': '#6c757d', 'text': '#6c757d', 'title': '备注'}
-    }
-
-    # 告示类型处理
-    for banner_type in banner_patterns.keys():
-        pattern = re.compile(
-            rf':::{banner_type}\s+([^\n]+?)\s*:::',
-            flags=re.DOTALL
-        )
-        markdown_text = pattern.sub(
-            lambda m: f'<div class="banner banner-{banner_type}">'
-                      '<div class="banner-header">'
-                      f'<i class="fa {banner_icons.get(banner_type, "fa-exclamation-circle")}"></i> '
-                      f'<h4>{banner_colors[banner_type]["title"]}</h4>'
-                      '</div>'
-                      f'<div class="banner-content">{m.group(1)}</div></div>',
-            markdown_text
-        )
-
-    # 预处理嵌套无序列表的缩进
-    markdown_text = re.sub(r'(\n\s{2})(\*|\+|-)\s', r'\1    \2 ', markdown_text)
-
-    # 启用 tables、breaks 和 fenced_code 扩展
-    html = markdown(
-        markdown_text,
-        extensions=['tables', 'nl2br', 'fenced_code']
-    )
-
-    # 创建一个 CSSSanitizer 实例，允许常用的 CSS 属性
-    css_sanitizer = CSSSanitizer(
-        allowed_css_properties=[
-            'color', 'font-size', 'font-weight', 'font-style', 'text-align',
-            'background-color', 'border', 'border-radius', 'padding', 'margin',
-            'width', 'height', 'display', 'flex', 'justify-content', 'align-items',
-            'text-decoration', 'line-height', 'list-style-type', 'overflow',
-            'overflow-x', 'overflow-y', 'white-space', 'word-wrap', 'word-break'
-        ]
-    )
-
-    allowed_tags = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'hr', 'br', 'div',
-                    'span', 'ul', 'ol', 'li', 'strong', 'em', 'code', 'blockquote',
-                    'a', 'img', 'table', 'thead', 'tbody', 'tr', 'th', 'td', 'i', 'iframe', 'blockquote', 'script']
-    allowed_attributes = {
-        'a': ['href', 'title', 'target', 'class', 'data-fancybox'],
-        'img': ['src', 'alt', 'width', 'height', 'class', 'data-fancybox'],
-        'div': ['class', 'style'],
-        'span': ['class', 'style'],
-        'table': ['class', 'style'],
-        'td': ['class', 'style'],
-        'th': ['class', 'style'],
-        'tr': ['class', 'style'],
-        'pre': ['class', 'style', 'data-line', 'data-line-offset', 'data-start'],
-        'code': ['class', 'style', 'data-prismjs-copy', 'data-prismjs-copy-error', 'data-prismjs-copy-success', 'data-prismjs-copy-timeout'],
-        'script': ['src', 'async'],
-        'i': ['class'],
-        'iframe': ['src','scrolling', 'border', 'framespacing', 'width', 'height', 'frameborder', 'allowfullscreen', 'allow', 'referrerpolicy'],
-        'blockquote': ['class', 'cite', 'style']
-    }
-
-    # 清理 HTML 内容
-    sanitized_html = bleach.clean(
-        html,
-        tags=allowed_tags,
-        attributes=allowed_attributes,
-        css_sanitizer=css_sanitizer,
-        strip=True
-    )
-
-    soup = BeautifulSoup(sanitized_html, 'html.parser')
-
-    # 添加 PrismJS 的 CSS 和 JS
-    prism_css = soup.new_tag('link', rel='stylesheet', href='https://cdnjs.cloudflare.com/ajax/libs/prism/1.29.0/themes/prism-okaidia.min.css')
-    prism_js = soup.new_tag('script', src='https://cdnjs.cloudflare.com/ajax/libs/prism/1.29.0/prism.min.js')
-    prism_autoloader_js = soup.new_tag('script', src='https://cdnjs.cloudflare.com/ajax/libs/prism/1.29.0/plugins/autoloader/prism-autoloader.min.js')
-    prism_line_numbers_css = soup.new_tag('link', rel='stylesheet', href='https://cdnjs.cloudflare.com/ajax/libs/prism/1.29.0/plugins/line-numbers/prism-line-numbers.min.css')
-    prism_line_highlight_css = soup.new_tag('link', rel='stylesheet', href='https://cdnjs.cloudflare.com/ajax/libs/prism/1.29.0/plugins/line-highlight/prism-line-highlight.min.css')
-    prism_toolbar_css = soup.new_tag('link', rel='stylesheet', href='https://cdnjs.cloudflare.com/ajax/libs/prism/1.29.0/plugins/toolbar/prism-toolbar.min.css')
-    prism_toolbar_js = soup.new_tag('script', src='https://cdnjs.cloudflare.com/ajax/libs/prism/1.29.0/plugins/toolbar/prism-toolbar.min.js')
-    prism_line_numbers_js = soup.new_tag('script', src='https://cdnjs.cloudflare.com/ajax/libs/prism/1.29.0/plugins/line-numbers/prism-line-numbers.min.js')
-    prism_line_highlight_js = soup.new_tag('script', src='https://cdnjs.cloudflare.com/ajax/libs/prism/1.29.0/plugins/line-highlight/prism-line-highlight.min.js')
-    prism_copy_to_clipboard_js = soup.new_tag('script', src='https://cdnjs.cloudflare.com/ajax/libs/prism/1.29.0/plugins/copy-to-clipboard/prism-copy-to-clipboard.min.js')
-    prism_show_language_js = soup.new_tag('script', src='https://cdnjs.cloudflare.com/ajax/libs/prism/1.29.0/plugins/show-language/prism-show-language.min.js')
-
-    if not soup.head:
-        head_tag = soup.new_tag('head')
-        soup.insert(0, head_tag)
-    soup.head.append(prism_css)
-    soup.head.append(prism_js)
-    soup.head.append(prism_autoloader_js)
-    soup.head.append(prism_line_numbers_css)
-    soup.head.append(prism_line_highlight_css)
-    soup.head.append(prism_toolbar_css)
-    soup.head.append(prism_toolbar_js)
-    soup.head.append(prism_line_numbers_js)
-    soup.head.append(prism_line_highlight_js)
-    soup.head.append(prism_copy_to_clipboard_js)
-    soup.head.append(prism_show_language_js)
-
-    # 处理代码块
-    for code_block in soup.find_all('code'):
-        parent_pre = code_block.find_parent('pre')
-        if parent_pre:
-            # 添加 PrismJS 需要的类
-            parent_pre['class'] = parent_pre.get('class', []) + ['line-numbers']
-            # 添加代码语言信息，如果未指定语言，则使用 'text' 作为默认语言
-            if 'class' in code_block.attrs:
-                for cls in code_block['class']:
-                    if cls.startswith('language-'):
-                        code_block['class'] = [cls]
-                        break
-            else:
-                code_block['class'] = ['language-text']
-
-    # 添加 CSS 样式
-    style_tag = soup.new_tag('style')
-    style_tag.string = '''
-    .styled-table {
-        border-collapse: collapse;
-        width: 100%;
-    }
-    .styled-table th, .styled-table td {
-        border: 1px solid #ddd;
-        padding: 8px;
-        text-align: left;
-    }
-    .styled-table tr:hover {
-        background-color: #f5f5f5;
-    }
-    .tiktok-embed {
-        margin: 20px 0;
-        border: 1px solid #ddd;
-        border-radius: 5px;
-        padding: 15px;
-        background-color: #f9f9f9;
-    }
-    '''
-
-    # 添加告示样式
-    for banner_type, colors in banner_colors.items():
-        style_tag.string += f'''
-        .banner.banner-{banner_type} {{
-            padding: 15px;
-            margin-bottom: 20px;
-            border: 1px solid {colors['border']};
-            border-radius: 4px;
-            background-color: {colors['bg']};
-            color: {colors['text']};
-        }}
-        .banner.banner-{banner_type} .banner-header {{
-            display: flex;
-            align-items: center;
-            margin-bottom: 10px;
-        }}
-        .banner.banner-{banner_type} .banner-header i {{
-            margin-right: 10px;
-            font-size: 1.2em;
-        }}
-        .banner.banner-{banner_type} .banner-header h4 {{
-            margin: 0;
-            font-size: 1em;
-            font-weight: bold;
-        }}
-        .banner.banner-{banner_type} .banner-content {{
-            margin: 0;
-            word-break: break-word;
-        }}
-        '''
-
-    if not soup.head:
-        head_tag = soup.new_tag('head')
-        soup.insert(0, head_tag)
-    soup.head.append(style_tag)
-
-    # 添加 FancyBox 的 CSS 和 JS
-    fancybox_css = soup.new_tag('link', rel='stylesheet', href='https://cdn.jsdelivr.net/npm/@fancyapps/ui@4.0/dist/fancybox.css')
-    fancybox_js = soup.new_tag('script', src='https://cdn.jsdelivr.net/npm/@fancyapps/ui@4.0/dist/fancybox.umd.js')
-    fancybox_js_initialization = soup.new_tag('script')
-    fancybox_js_initialization.string = '''
-    document.addEventListener("DOMContentLoaded", function() {
-        Fancybox.bind('[data-fancybox="gallery"]', {
-            loop: true,
-            buttons: ["zoom", "slideShow", "fullScreen", "thumbs", "close"],
-            image: {
-                zoom: true
-            }
-        });
-    });
-    '''
-    soup.head.append(fancybox_css)
-    soup.head.append(fancybox_js)
-    soup.head.append(fancybox_js_initialization)
-
-    # 处理图片添加 FancyBox 支持
-    for img in soup.find_all('img'):
-        if 'src' in img.attrs:
-            img['class'] = img.get('class', []) + ['fancybox']
-            img['data-fancybox'] = 'gallery'
-            img['data-caption'] = img.get('alt', '')
-
-    # 处理 iframe 嵌入代码
-    for iframe in soup.find_all('iframe'):
-        if 'src' in iframe.attrs:
-            src = iframe['src']
-            # 处理 B 站视频嵌入
-            if re.match(r'//player\.bilibili\.com/player\.html\?isOutside=true&.*', src):
-                iframe['width'] = iframe.get('width', '640')
-                iframe['height'] = iframe.get('height', '360')
-                iframe['allowfullscreen'] = iframe.get('allowfullscreen', 'true')
-            # 处理优酷视频嵌入
-            elif re.match(r'https?://player\.youku\.com/embed/.*', src):
-                iframe['width'] = iframe.get('width', '510')
-                iframe['height'] = iframe.get('height', '498')
-                iframe['frameborder'] = iframe.get('frameborder', '0')
-                iframe['allowfullscreen'] = iframe.get('allowfullscreen', 'true')
-            # 处理网易云音乐播放器嵌入
-            elif re.match(r'//music\.163\.com/outchain/player\?type=2&.*', src):
-                iframe['width'] = iframe.get('width', '330')
-                iframe['height'] = iframe.get('height', '86')
-                iframe['frameborder'] = iframe.get('frameborder', 'no')
-                iframe['border'] = iframe.get('border', '0')
-            # 处理网易云音乐歌单嵌入
-            elif re.match(r'//music\.163\.com/outchain/player\?type=0&.*', src):
-                if 'height=430' in src:
-                    iframe['width'] = iframe.get('width', '330')
-                    iframe['height'] = iframe.get('height', '450')
-                elif 'height=90' in src:
-                    iframe['width'] = iframe.get('width', '330')
-                    iframe['height'] = iframe.get('height', '110')
-                iframe['frameborder'] = iframe.get('frameborder', 'no')
-                iframe['border'] = iframe.get('border', '0')
-            # 处理腾讯视频嵌入
-            elif re.match(r'https?://v\.qq\.com/txp/iframe/player\.html\?vid=.*', src):
-                iframe['width'] = iframe.get('width', '640')
-                iframe['height'] = iframe.get('height', '360')
-                iframe['frameborder'] = iframe.get('frameborder', '0')
-                iframe['allowfullscreen'] = iframe.get('allowfullscreen', 'true')
-            # 处理 YouTube 嵌入
-            elif re.match(r'https?://www\.youtube\.com/embed/.*', src) or re.match(r'https?://www\.youtube-nocookie\.com/embed/.*', src):
-                iframe['width'] = iframe.get('width', '560')
-                iframe['height'] = iframe.get('height', '315')
-                iframe['frameborder'] = iframe.get('frameborder', '0')
-                iframe['allow'] = iframe.get('allow', 'accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture')
-                iframe['referrerpolicy'] = iframe.get('referrerpolicy', 'strict-origin-when-cross-origin')
-                iframe['allowfullscreen'] = iframe.get('allowfullscreen', 'true')
+    # 内容相同（包括重新保存未修改的内容）时直接复用渲染结果
+    key = render_cache.key(markdown_text)
+    html = render_cache.get(key)
+    if html is None:
+        html = render_markdown(markdown_text)
+        render_cache.set(key, html)
+    return html
+
+
+# 告示（banner）类型对应的 Font 图标和标题，配色见 static/css/markdown.css
+BANNER_TYPES = {
+    'tip': ('fa-lightbulb', '提示'),
+    'warning': ('fa-exclamation-triangle', '警告'),
+    'caution': ('fa-triangle-exclamation', '注意'),
+    'danger': ('fa-skull', '危险'),
+    'check': ('fa-check-circle', '检查'),
+    'info': ('fa-circle-info', '信息'),
+    'note': ('fa-book', '备注')
+}
+
+# 允许常用的 CSS 属性
+CSS_SANITIZER = CSSSanitizer(
+    allowed_css_properties=[
+        'color', 'font-size', 'font-weight', 'font-style', 'text-align',
+        'background-color', 'border', 'border-radius', 'padding', 'margin',
+        'width', 'height', 'display', 'flex', 'justify-content', 'align-items',
+        'text-decoration', 'line-height', 'list-style-type', 'overflow',
+        'overflow-x', 'overflow-y', 'white-space', 'word-wrap', 'word-break'
+    ]
+)
+
+ALLOWED_TAGS = frozenset(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'hr', 'br', 'div',
+                          'span', 'ul', 'ol', 'li', 'strong', 'em', 'code', 'blockquote',
+                          'a', 'img', 'table', 'thead', 'tbody', 'tr', 'th', 'td', 'i', 'iframe', 'script'])
+ALLOWED_ATTRIBUTES = {
+    'a': ['href', 'title', 'target', 'class', 'data-fancybox'],
+    'img': ['src', 'alt', 'width', 'height', 'class', 'data-fancybox'],
+    'div': ['class', 'style'],
+    'span': ['class', 'style'],
+    'table': ['class', 'style'],
+    'td': ['class', 'style'],
+    'th': ['class', 'style'],
+    'tr': ['class', 'style'],
+    'pre': ['class', 'style', 'data-line', 'data-line-offset', 'data-start'],
+    'code': ['class', 'style', 'data-prismjs-copy', 'data-prismjs-copy-error', 'data-prismjs-copy-success', 'data-prismjs-copy-timeout'],
+    'script': ['src', 'async'],
+    'i': ['class'],
+    'iframe': ['src','scrolling', 'border', 'framespacing', 'width', 'height', 'frameborder', 'allowfullscreen', 'allow', 'referrerpolicy'],
+    'blockquote': ['class', 'cite', 'style']
+}
+
+MARKDOWN_EXTENSIONS = ['tables', 'nl2br', 'fenced_code']
+
+# 允许嵌入的 iframe 来源、默认属性（用户未指定时补上），以及按 src 参数决定的宽高
+EMBED_RULES = [
+    # B 站视频
+    (re.compile(r'//player\.bilibili\.com/player\.html\?isOutside=true&'),
+     {'width': '640', 'height': '360', 'allowfullscreen': 'true'}, None),
+    # 优酷视频
+    (re.compile(r'https?://player\.youku\.com/embed/'),
+     {'width': '510', 'height': '498', 'frameborder': '0', 'allowfullscreen': 'true'}, None),
+    # 网易云音乐播放器
+    (re.compile(r'//music\.163\.com/outchain/player\?type=2&'),
+     {'width': '330', 'height': '86', 'frameborder': 'no', 'border': '0'}, None),
+    # 网易云音乐歌单
+    (re.compile(r'//music\.163\.com/outchain/player\?type=0&'),
+     {'frameborder': 'no', 'border': '0'}, {'height=430': ('330', '450'), 'height=90': ('330', '110')}),
+    # 腾讯视频
+    (re.compile(r'https?://v\.qq\.com/txp/iframe/player\.html\?vid='),
+     {'width': '640', 'height': '360', 'frameborder': '0', 'allowfullscreen': 'true'}, None),
+    # YouTube
+    (re.compile(r'https?://www\.youtube(-nocookie)?\.com/embed/'),
+     {'width': '560', 'height': '315', 'frameborder': '0',
+      'allow': 'accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture',
+      'referrerpolicy': 'strict-origin-when-cross-origin', 'allowfullscreen': 'true'}, None)
+]
+
+TIKTOK_STYLE = 'max-width: 605px; min-width: 325px; margin: 20px 0; padding: 15px; border: 1px solid #ddd; ' \
+               'border-radius: 5px; background-color: #f9f9f9;'
+TIKTOK_SCRIPT = 'https://www.tiktok.com/embed.js'
+
+
+def _get_classes(token):
+    return token['data'].get((None, 'class'), '').split()
+
+
+def _set_default(token, name, value):
+    token['data'].setdefault((None, name), value)
+
+
+class PrismCodeFilter(Filter):
+    """
+    给代码块加上 PrismJS 需要的类：<pre> 加 line-numbers，
+    <code> 只保留第一个 language-* 类，未指定语言时使用 language-text
+    是否包含代码要等到 </pre> 才知道，<pre> 内的 token 先缓存
+    """
+
+    def __iter__(self):
+        stack = []  # 未闭合的 <pre>：[开始标签, 是否包含代码, 缓存的 token]
+        for token in super().__iter__():
+            token_type, name = token['type'], token.get('name')
+            if token_type == 'StartTag' and name == 'pre':
+                stack.append([token, False, []])
+                continue
+
+            if token_type == 'StartTag' and name == 'code' and stack:
+                stack[-1][1] = True
+                if (None, 'class') in token['data']:
+                    for cls in _get_classes(token):
+                        if cls.startswith('language-'):
+                            token['data'][(None, 'class')] = cls
+                            break
+                else:
+                    token['data'][(None, 'class')] = 'language-text'
+
+            if token_type == 'EndTag' and name == 'pre' and stack:
+                start, has_code, tokens = stack.pop()
+                if has_code:
+                    start['data'][(None, 'class')] = ' '.join(_get_classes(start) + ['line-numbers'])
+                tokens = [start, *tokens, token]
+                if stack:
+                    stack[-1][2].extend(tokens)
+                else:
+                    yield from tokens
+                continue
+
+            if stack:
+                stack[-1][2].append(token)
             else:
-                iframe.decompose()
+                yield token
 
-    # 处理 TikTok 嵌入代码
-    for blockquote in soup.find_all('blockquote', class_='tiktok-embed'):
-        # 添加样式
-        blockquote['style'] = blockquote.get('style','max-width: 605px; min-width: 325px; margin: 20px 0; padding: 15px; border: 1px solid #ddd; border-radius: 5px; background-color: #f9f9f9;')
-        # 确保 blockquote 内的 script 标签被保留
-        script_tag = soup.new_tag('script', src='https://www.tiktok.com/embed.js', async_=True)
-        blockquote.append(script_tag)
+        for start, _, tokens in stack:
+            yield start
+            yield from tokens
+
+
+class FancyboxImageFilter(Filter):
+    """图片加入 FancyBox 图集"""
+
+    def __iter__(self):
+        for token in super().__iter__():
+            if token['type'] in ('StartTag', 'EmptyTag') and token['name'] == 'img' and (None, 'src') in token['data']:
+                data = token['data']
+                data[(None, 'class')] = ' '.join(_get_classes(token) + ['fancybox'])
+                data[(None, 'data-fancybox')] = 'gallery'
+                data[(None, 'data-caption')] = data.get((None, 'alt'), '')
+            yield token
+
+
+class EmbedFilter(Filter):
+    """只保留白名单来源的 iframe 并补全默认属性，其余 iframe 连同内容一起移除"""
+
+    def __iter__(self):
+        skipping = False
+        for token in super().__iter__():
+            if skipping:
+                if token['type'] == 'EndTag' and token['name'] == 'iframe':
+                    skipping = False
+                continue
+
+            if token['type'] == 'StartTag' and token['name'] == 'iframe' and (None, 'src') in token['data']:
+                src = token['data'][(None, 'src')]
+                for pattern, defaults, sizes in EMBED_RULES:
+                    if pattern.match(src):
+                        for marker, (width, height) in (sizes or {}).items():
+                            if marker in src:
+                                _set_default(token, 'width', width)
+                                _set_default(token, 'height', height)
+                                break
+                        for name, value in defaults.items():
+                            _set_default(token, name, value)
+                        break
+                else:
+                    skipping = True
+                    continue
+            yield token
+
+
+class TikTokEmbedFilter(Filter):
+    """TikTok 嵌入的 blockquote 补上默认样式，并在末尾加入官方嵌入脚本"""
+
+    def __iter__(self):
+        stack = []  # 未闭合的 blockquote 是否为 TikTok 嵌入
+        for token in super().__iter__():
+            if token['type'] == 'StartTag' and token['name'] == 'blockquote':
+                is_tiktok = 'tiktok-embed' in _get_classes(token)
+                if is_tiktok:
+                    _set_default(token, 'style', TIKTOK_STYLE)
+                stack.append(is_tiktok)
+            elif token['type'] == 'EndTag' and token['name'] == 'blockquote' and stack and stack.pop():
+                yield {'type': 'StartTag', 'name': 'script', 'namespace': None,
+                       'data': {(None, 'src'): TIKTOK_SCRIPT, (None, 'async'): ''}}
+                yield {'type': 'EndTag', 'name': 'script', 'namespace': None}
+            yield token
+
+
+# 在 bleach 清理之后依次执行，与清理共用一次解析和序列化
+POST_FILTERS = [PrismCodeFilter, FancyboxImageFilter, EmbedFilter, TikTokEmbedFilter]
+
+
+class MarkdownRenderer:
+    """
+    Markdown 渲染器，正则、白名单和 CSSSanitizer 在模块加载时构建一次
+    Markdown 和 bleach.Cleaner 实例内部有解析状态，不是线程安全的，按线程各保留一份复用
+    """
+    # 所有告示类型合并为一个正则，一次扫描完成替换；内容限定在单行内，避免 ReDoS 攻击
+    banner_pattern = re.compile(rf':::({"|".join(BANNER_TYPES)})\s+([^\n]+?)\s*:::')
+    # 嵌套无序列表的缩进
+    list_indent_pattern = re.compile(r'(\n\s{2})(\*|\+|-)\s')
+
+    def __init__(self):
+        # 告示类型 -> 该类型的 HTML 头部，替换时只需拼接内容
+        self.banner_templates = {
+            banner_type: f'<div class="banner banner-{banner_type}">'
+                         '<div class="banner-header">'
+                         f'<i class="fa {icon}"></i> '
+                         f'<h4>{title}</h4>'
+                         '</div>'
+                         '<div class="banner-content">'
+            for banner_type, (icon, title) in BANNER_TYPES.items()
+        }
+        self._local = threading.local()
+
+    def _replace_banner(self, match):
+        return f'{self.banner_templates[match.group(1)]}{match.group(2)}</div></div>'
+
+    def preprocess(self, markdown_text):
+        markdown_text = self.banner_pattern.sub(self._replace_banner, markdown_text)
+        return self.list_indent_pattern.sub(r'\1    \2 ', markdown_text)
+
+    def _get_markdown(self):
+        md = getattr(self._local, 'markdown', None)
+        if md is None:
+            # 启用 tables、breaks 和 fenced_code 扩展
+            md = self._local.markdown = Markdown(extensions=MARKDOWN_EXTENSIONS)
+        return md
+
+    def _get_cleaner(self):
+        cleaner = getattr(self._local, 'cleaner', None)
+        if cleaner is None:
+            cleaner = self._local.cleaner = bleach.Cleaner(
+                tags=ALLOWED_TAGS,
+                attributes=ALLOWED_ATTRIBUTES,
+                css_sanitizer=CSS_SANITIZER,
+                strip=True,
+                filters=POST_FILTERS
+            )
+        return cleaner
+
+    def render(self, markdown_text):
+        md = self._get_markdown()
+        html = md.reset().convert(self.preprocess(markdown_text))
+        # 清理 HTML 内容，代码块、图片和嵌入内容的处理在同一次解析中由过滤器完成
+        return self._get_cleaner().clean(html)
+
+
+renderer = MarkdownRenderer()
+
+
+def render_markdown(markdown_text):
+    return renderer.render(markdown_text)
+
+
+# 旧版本解析器在每段 HTML 开头注入的 <head>（PrismJS、FancyBox、样式），这些资源现在由页面模板统一加载
+_injected_head_pattern = re.compile(r'^\s*<head>.*?</head>', flags=re.DOTALL)
+
+
+def strip_injected_assets(html):
+    return _injected_head_pattern.sub('', html, count=1)
+
+
+EXCERPT_LENGTH = 150
+
+# 列表摘要需要去掉的 Markdown 语法，合并为一个正则单次扫描；按顺序优先匹配图片、链接等较长的结构
+_markdown_syntax_pattern = re.compile(
+    r'!\[[^\]\n]*\]\([^)\n]*\)'              # 图片
+    r'|\[(?P<link>[^\]\n]*)\]\([^)\n]*\)'     # 链接，保留文字
+    r'|<[^>\n]+>'                             # HTML 标签
+    r'|^:::\w*|:::'                           # 告示标记
+    r'|^ {0,3}(?:[-*_=] *){3,}$'               # 分隔线、标题下划线
+    r'|^ *(?:#{1,6}|>+|[-*+]|\d+\.) +'         # 标题、引用、列表标记
+    r'|```\w*|\*\*|__|[*`#]',                  # 代码块标记、强调、行内代码
+    flags=re.MULTILINE
+)
+
+
+def _strip_markdown_syntax(match):
+    return match.group('link') or ''
 
-    cleaned_html = str(soup)
-    return cleaned_html
 
 def remove_markdown(text):
-    text = re.sub(r'\*\*', '', text)
-    text = re.sub(r'\*', '', text)
-    text = re.sub(r'`', '', text)
-    text = re.sub(r'#', '', text)
-    text = re.sub(r'\n-{3,}', '', text)
-    text = re.sub(r'\n={3,}', '', text)
-    text = re.sub(r'\n\* \n', '', text)
-    text = re.sub(r'\n\d\.', '', text)
-    text = re.sub(r'!\[.*?\]\(.*?\)', '', text)
-    return text
+    return _markdown_syntax_pattern.sub(_strip_markdown_syntax, text)
+
+
+def make_excerpt(text, length=EXCERPT_LENGTH):
+    """帖子列表中显示的纯文本摘要：先去掉完整内容中的 Markdown 语法再截断，语法不会在截断处残留"""
+    plain = ' '.join(remove_markdown(text).split())
+    return plain[:length] + '...' if len(plain) > length else plain
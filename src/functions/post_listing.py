@@ -0,0 +1,70 @@
+"""
+帖子列表总数的缓存键和失效
+帖子增删、删除标记或板块变化时记录受影响的列表，提交后从 count_cache 中清除对应的总数，回滚时丢弃
+"""
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from src.functions.database.models import Post
+from src.functions.section.section_counts import post_placement_change, PLACEMENT_UNKNOWN
+from src.functions.utils.pagination import count_cache
+
+
+def post_count_key(**filters):
+    """帖子列表总数在 count_cache 中的键"""
+    return 'posts', tuple(sorted(filters.items()))
+
+
+def _pending(target):
+    session = inspect(target).session
+    if session is None:
+        return None
+    return session.info.setdefault('post_listing', {'keys': set(), 'stale': False})
+
+
+def _listings_changed(target, *section_ids):
+    """首页和这些板块的帖子列表总数需要在提交后重新统计"""
+    pending = _pending(target)
+    if pending is None:
+        return
+    pending['keys'].add(post_count_key())
+    pending['keys'].update(post_count_key(section_id=section_id) for section_id in section_ids)
+
+
+@event.listens_for(Post, 'after_insert')
+@event.listens_for(Post, 'after_delete')
+def _post_added_or_removed(mapper, connection, target):
+    if not target.deleted:
+        _listings_changed(target, target.section_id)
+
+
+@event.listens_for(Post, 'after_update')
+def _post_updated(mapper, connection, target):
+    change = post_placement_change(target)
+    if change is None:
+        return
+    if change is PLACEMENT_UNKNOWN:
+        # 修改前的删除标记或板块未加载，不知道要清除哪些列表的总数
+        pending = _pending(target)
+        if pending is not None:
+            pending['stale'] = True
+        return
+    old_section, new_section = change
+    if old_section != new_section:
+        _listings_changed(target, *(section_id for section_id in change if section_id is not None))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_after_commit(session):
+    pending = session.info.pop('post_listing', None)
+    if pending is None:
+        return
+    if pending['stale']:
+        count_cache.clear()
+    else:
+        count_cache.invalidate(*pending['keys'])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('post_listing', None)
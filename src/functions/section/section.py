@@ -1,11 +1,13 @@
 from datetime import datetime, timedelta
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_wtf.csrf import validate_csrf
-from sqlalchemy import func
 
 from src.db_ext import db
-from src.functions.database.models import Section, Post, Comment, User
+from src.functions.database.models import Section
+from src.functions.index import paginate_posts
+from src.functions.section.section_delete import remove_section
+from src.functions.section.section_stats import RANGE_OPTIONS, section_activity, activity_trend, top_authors
 
 # 创建蓝图
 section_bp = Blueprint('section', __name__, url_prefix='/section')
@@ -13,16 +15,8 @@ section_bp = Blueprint('section', __name__, url_prefix='/section')
 # 获取所有板块
 @section_bp.route('/')
 def sections():
+    # 帖子数和回复数随帖子、评论的增删增量维护，这里只读取
     sections = Section.query.all()
-    for section in sections:
-        # 动态更新帖子数量
-        section.post_count = Post.query.filter_by(section_id=section.id, deleted=False).count()
-        # 动态更新回复数量
-        section.comment_count = Comment.query.join(Post).filter(
-            Post.section_id == section.id,
-            Post.deleted == False
-        ).count()
-    db.session.commit()
     return render_template('section/sections.html', sections=sections)
 
 # 创建板块
@@ -69,17 +63,8 @@ def section_detail(section_id):
 # 时间线排序（板块内）
 @section_bp.route('/detail/<int:section_id>/newest')
 def section_newest(section_id):
-    page = request.args.get('page', 1, type=int)
-    per_page = 10
-
     # 查询该板块下的帖子并按时间线排序
-    posts = Post.query.filter_by(section_id=section_id, deleted=False).order_by(
-        Post.created_at.desc()
-    ).paginate(
-        page=page,
-        per_page=per_page,
-        error_out=False
-    )
+    posts = paginate_posts('timeline', section_id=section_id)
 
     section = Section.query.get_or_404(section_id)
     return render_template(
@@ -93,18 +78,8 @@ def section_newest(section_id):
 # 全局排序（板块内）
 @section_bp.route('/detail/<int:section_id>/global_sort')
 def section_global_sort(section_id):
-    page = request.args.get('page', 1, type=int)
-    per_page = 10
-
     # 查询该板块下的帖子并按全局排序
-    posts = Post.query.filter_by(section_id=section_id, deleted=False).order_by(
-        Post.like_count.desc(),
-        Post.created_at.desc()
-    ).paginate(
-        page=page,
-        per_page=per_page,
-        error_out=False
-    )
+    posts = paginate_posts('global', section_id=section_id)
 
     section = Section.query.get_or_404(section_id)
     return render_template(
@@ -118,42 +93,25 @@ def section_global_sort(section_id):
 # 板块分析
 @section_bp.route('/analytics')
 def section_analytics():
-    # 获取版块活跃度排名
-    section_post_counts = db.session.query(
-        Section,
-        func.count(Post.id).label('post_count')
-    ).outerjoin(Post, Section.id == Post.section_id).filter(Post.deleted == False).group_by(Section.id).order_by(func.count(Post.id).desc()).all()
-
-    # 获取近7天发帖趋势
-    daily_post_counts = []
-    for i in range(6, -1, -1):
-        date = datetime.now() - timedelta(days=i)
-        count = Post.query.filter(
-            func.date(Post.created_at) == date.date(),
-            Post.deleted == False
-        ).count()
-        daily_post_counts.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'count': count
-        })
-
-    # 获取版块活跃用户
-    section_active_users = {}
-    for section, post_count in section_post_counts:
-        users = db.session.query(
-            User,
-            func.count(Post.id).label('post_count')
-        ).outerjoin(Post, User.id == Post.author_id).filter(
-            Post.section_id == section.id,  # 使用 section.id
-            Post.deleted == False
-        ).group_by(User.id).order_by(func.count(Post.id).desc()).limit(5).all()
-        section_active_users[section.id] = users  # 使用 section.id
+    days = request.args.get('days', 7, type=int)
+    if days not in RANGE_OPTIONS:
+        days = RANGE_OPTIONS[0]
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+
+    # 三个分组查询都只读取每日汇总表，查询次数与板块数量和日期范围无关；
+    # 日期范围只用于发帖趋势，活跃度排名和活跃用户统计全部历史
+    section_post_counts = section_activity()
+    daily_post_counts = activity_trend(start, end)
+    section_active_users = top_authors()
 
     return render_template(
         'section/section_analytics.html',
         section_post_counts=section_post_counts,
         daily_post_counts=daily_post_counts,
-        section_active_users=section_active_users
+        section_active_users=section_active_users,
+        days=days,
+        range_options=RANGE_OPTIONS
     )
 
 # 编辑板块
@@ -211,21 +169,8 @@ def delete_section(section_id):
 
     section = Section.query.get_or_404(section_id)
 
-    # 删除板块关联的帖子和评论
-    posts = Post.query.filter_by(section_id=section_id).all()
-    for post in posts:
-        comments = Comment.query.filter_by(post_id=post.id).all()
-        for comment in comments:
-            db.session.delete(comment)
-        db.session.delete(post)
-
-    # 重置板块的帖子和回复数量
-    section.post_count = 0
-    section.comment_count = 0
-    db.session.commit()
-
-    db.session.delete(section)
-    db.session.commit()
+    # 分批删除板块下的帖子、评论及其点赞、举报等数据，再删除板块本身
+    remove_section(section.id, log=current_app.logger.info)
 
     flash('板块删除成功', 'success')
     return redirect(url_for('section.sections'))
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""
+板块的帖子数和回复数
+帖子、评论新增或删除（包括软删除和恢复）时，在同一事务中用 UPDATE ... SET x = x + n 增量更新所属板块，
+板块列表页直接读取 Section 表；批量修改等未经过 ORM 事件的变化由定时任务重新统计校准。
+统计口径与原先的动态计算一致：帖子数为未删除的帖子，回复数为未删除帖子下的全部评论
+"""
+from sqlalchemy import event, inspect, select, update, func
+
+from src.db_ext import db
+from src.functions.database.models import Section, Post, Comment
+
+
+def _adjust(connection, section_id, posts=0, comments=0):
+    if section_id is None or (posts == 0 and comments == 0):
+        return
+    connection.execute(
+        update(Section.__table__)
+        .where(Section.__table__.c.id == section_id)
+        .values(post_count=func.coalesce(Section.__table__.c.post_count, 0) + posts,
+                comment_count=func.coalesce(Section.__table__.c.comment_count, 0) + comments)
+    )
+
+
+def _post_comment_count(connection, post_id):
+    comment = Comment.__table__
+    return connection.execute(select(func.count()).select_from(comment).where(comment.c.post_id == post_id)).scalar()
+
+
+def live_post_section(connection, post_id):
+    """返回帖子所属板块，帖子不存在或已删除时返回 None"""
+    post = Post.__table__
+    row = connection.execute(select(post.c.section_id, post.c.deleted).where(post.c.id == post_id)).first()
+    if row is None or row.deleted:
+        return None
+    return row.section_id
+
+
+# 修改前的删除标记或板块没有加载过，无法计算增量
+PLACEMENT_UNKNOWN = object()
+
+
+def post_placement_change(target):
+    """
+    帖子更新时删除标记或所属板块的变化，返回 (修改前板块, 修改后板块)，已删除的帖子记为 None；
+    两者都没有变化时返回 None，修改前的值未知时返回 PLACEMENT_UNKNOWN
+    """
+    state = inspect(target)
+    deleted_history = state.attrs.deleted.history
+    section_history = state.attrs.section_id.history
+    if not deleted_history.has_changes() and not section_history.has_changes():
+        return None
+    if (deleted_history.has_changes() and not deleted_history.deleted) or \
+            (section_history.has_changes() and not section_history.deleted):
+        return PLACEMENT_UNKNOWN
+    was_deleted = deleted_history.deleted[0] if deleted_history.has_changes() else target.deleted
+    old_section = section_history.deleted[0] if section_history.has_changes() else target.section_id
+    return (None if was_deleted else old_section), (None if target.deleted else target.section_id)
+
+
+def reconcile_section_counts(connection=None):
+    """按当前数据重新统计所有板块的帖子数和回复数"""
+    section, post, comment = Section.__table__, Post.__table__, Comment.__table__
+    live_posts = select(func.count()).select_from(post) \
+        .where(post.c.section_id == section.c.id, post.c.deleted == False).scalar_subquery()
+    live_comments = select(func.count()).select_from(comment.join(post, comment.c.post_id == post.c.id)) \
+        .where(post.c.section_id == section.c.id, post.c.deleted == False).scalar_subquery()
+    statement = update(section).values(post_count=live_posts, comment_count=live_comments)
+    if connection is not None:
+        connection.execute(statement)
+    else:
+        db.session.execute(statement)
+        db.session.commit()
+
+
+@event.listens_for(Post, 'after_insert')
+def _post_inserted(mapper, connection, target):
+    if not target.deleted:
+        _adjust(connection, target.section_id, posts=1)
+
+
+@event.listens_for(Post, 'after_update')
+def _post_updated(mapper, connection, target):
+    change = post_placement_change(target)
+    if change is None:
+        return
+    if change is PLACEMENT_UNKNOWN:
+        reconcile_section_counts(connection)
+        return
+    old_section, new_section = change
+    comments = _post_comment_count(connection, target.id)
+    _adjust(connection, old_section, posts=-1, comments=-comments)
+    _adjust(connection, new_section, posts=1, comments=comments)
+
+
+@event.listens_for(Post, 'before_delete')
+def _post_deleted(mapper, connection, target):
+    # 会话中已加载的评论在此之前已经删除并各自扣减过，这里扣减剩下的（由数据库级联删除的）评论
+    if not target.deleted:
+        _adjust(connection, target.section_id, posts=-1, comments=-_post_comment_count(connection, target.id))
+
+
+@event.listens_for(Comment, 'after_insert')
+def _comment_inserted(mapper, connection, target):
+    _adjust(connection, live_post_section(connection, target.post_id), comments=1)
+
+
+@event.listens_for(Comment, 'after_delete')
+def _comment_deleted(mapper, connection, target):
+    _adjust(connection, live_post_section(connection, target.post_id), comments=-1)
@@ -0,0 +1,63 @@
+"""
+批量删除板块
+按帖子 ID 分批，每批用几条 DELETE ... WHERE post_id IN (...) 删除帖子、评论以及依赖它们的点赞、举报、楼中楼回复和搜索索引，
+每批提交一次，SQLite 写锁只持有一批的时间；这些语句绕过了 ORM 事件，
+结束后统一清理由事件维护的统计和缓存
+"""
+from sqlalchemy import select, delete, or_
+
+from src.db_ext import db
+from src.functions.database.models import Section, Post, Comment, Like, Report, ReplyComment, SectionDailyStat, \
+    SectionAuthorDailyStat
+from src.functions.service.forum_stats import forum_stats
+from src.functions.service.search_cache import search_cache
+from src.functions.service.search_index import remove_post_documents
+from src.functions.service.search_suggest import search_suggester
+from src.functions.utils.pagination import count_cache
+
+
+def _delete_posts(connection, post_ids):
+    """删除一批帖子及其全部依赖数据，返回删除的评论数"""
+    comment_ids = select(Comment.id).where(Comment.post_id.in_(post_ids)).scalar_subquery()
+    connection.execute(delete(ReplyComment).where(ReplyComment.target_comment_id.in_(comment_ids)))
+    connection.execute(delete(Like).where(or_(Like.post_id.in_(post_ids), Like.comment_id.in_(comment_ids))))
+    connection.execute(delete(Report).where(or_(Report.post_id.in_(post_ids), Report.comment_id.in_(comment_ids))))
+    remove_post_documents(connection, post_ids)
+    comments = connection.execute(delete(Comment).where(Comment.post_id.in_(post_ids))).rowcount
+    connection.execute(delete(Post).where(Post.id.in_(post_ids)))
+    return comments
+
+
+def delete_section_posts(section_id, batch_size=500, log=print):
+    """分批删除板块下的全部帖子和评论，返回 (帖子数, 评论数)"""
+    posts = comments = 0
+    while True:
+        post_ids = db.session.execute(
+            select(Post.id).where(Post.section_id == section_id).order_by(Post.id).limit(batch_size)
+        ).scalars().all()
+        if not post_ids:
+            break
+        comments += _delete_posts(db.session.connection(), post_ids)
+        db.session.commit()
+
+        posts += len(post_ids)
+        log(f"section {section_id}: 已删除 {posts} 篇帖子、{comments} 条评论")
+    return posts, comments
+
+
+def remove_section(section_id, batch_size=500, log=print):
+    """删除板块及其全部内容，返回 (帖子数, 评论数)"""
+    try:
+        posts, comments = delete_section_posts(section_id, batch_size, log)
+        db.session.execute(delete(SectionAuthorDailyStat).where(SectionAuthorDailyStat.section_id == section_id))
+        db.session.execute(delete(SectionDailyStat).where(SectionDailyStat.section_id == section_id))
+        db.session.execute(delete(Section).where(Section.id == section_id))
+        db.session.commit()
+    finally:
+        # 已提交的批次即使中途失败也已生效，统计和缓存都需要更新
+        db.session.expire_all()
+        forum_stats.invalidate()
+        count_cache.clear()
+        search_cache.invalidate()
+        search_suggester.mark_dirty()
+    return posts, comments
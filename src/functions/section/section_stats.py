@@ -0,0 +1,286 @@
+"""
+板块每日汇总（板块 × 日期 → 发帖数、回复数、活跃作者数）
+帖子、评论新增或删除（包括软删除、恢复和移动板块）时在同一事务中增量更新 SectionAuthorDailyStat，
+再由它重新汇总对应那一天的 SectionDailyStat；板块分析页只对汇总表做分组查询，
+查询次数与板块数量和日期范围无关。历史数据和偏差由 rebuild_daily_stats 重新生成。
+统计口径与板块计数一致：未删除的帖子，以及未删除帖子下的全部评论，日期按 UTC 计算
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select, delete, func, literal, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from src.db_ext import db
+from src.functions.database.models import Section, Post, Comment, User, SectionDailyStat, SectionAuthorDailyStat
+from src.functions.section.section_counts import live_post_section, post_placement_change, PLACEMENT_UNKNOWN
+
+# 板块分析页可选的日期范围（天）
+RANGE_OPTIONS = (7, 30, 90, 365)
+
+daily_table = SectionDailyStat.__table__
+author_table = SectionAuthorDailyStat.__table__
+
+
+def _day_of(value):
+    return (value or datetime.utcnow()).date()
+
+
+def _day_range(column, start, end):
+    """日期范围条件，start/end 为 None 时不限制"""
+    conditions = []
+    if start is not None:
+        conditions.append(column >= start)
+    if end is not None:
+        conditions.append(column <= end)
+    return conditions
+
+
+def _refresh_day(connection, section_id, day):
+    """按作者明细重新汇总某个板块某一天"""
+    posts, comments, authors = connection.execute(
+        select(func.coalesce(func.sum(author_table.c.post_count), 0),
+               func.coalesce(func.sum(author_table.c.comment_count), 0),
+               func.count())
+        .where(author_table.c.section_id == section_id, author_table.c.day == day)
+    ).one()
+    if authors == 0:
+        connection.execute(delete(daily_table).where(daily_table.c.section_id == section_id, daily_table.c.day == day))
+        return
+    statement = sqlite_insert(daily_table).values(
+        section_id=section_id, day=day, post_count=posts, comment_count=comments, author_count=authors
+    )
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[daily_table.c.section_id, daily_table.c.day],
+        set_={'post_count': statement.excluded.post_count,
+              'comment_count': statement.excluded.comment_count,
+              'author_count': statement.excluded.author_count}
+    ))
+
+
+def _bump(connection, section_id, contributions):
+    """
+    contributions: {(日期, 作者 id): (帖子增量, 评论增量)}
+    更新作者明细，计数归零的行直接删除，然后重新汇总受影响的日期
+    """
+    if section_id is None or not contributions:
+        return
+    for (day, author_id), (posts, comments) in contributions.items():
+        statement = sqlite_insert(author_table).values(
+            section_id=section_id, day=day, author_id=author_id, post_count=posts, comment_count=comments
+        )
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[author_table.c.section_id, author_table.c.day, author_table.c.author_id],
+            set_={'post_count': author_table.c.post_count + statement.excluded.post_count,
+                  'comment_count': author_table.c.comment_count + statement.excluded.comment_count}
+        ))
+    days = {day for day, _ in contributions}
+    connection.execute(delete(author_table).where(
+        author_table.c.section_id == section_id, author_table.c.day.in_(days),
+        author_table.c.post_count <= 0, author_table.c.comment_count <= 0
+    ))
+    for day in days:
+        _refresh_day(connection, section_id, day)
+
+
+def _post_contributions(connection, post, sign):
+    """帖子本身以及其下全部评论对汇总的贡献"""
+    contributions = {(_day_of(post.created_at), post.author_id): (sign, 0)}
+    comment = Comment.__table__
+    rows = connection.execute(
+        select(comment.c.created_at, comment.c.author_id).where(comment.c.post_id == post.id)
+    ).all()
+    for (day, author_id), count in Counter((_day_of(created_at), author_id) for created_at, author_id in rows).items():
+        posts, comments = contributions.get((day, author_id), (0, 0))
+        contributions[(day, author_id)] = (posts, comments + sign * count)
+    return contributions
+
+
+def rebuild_daily_stats(start=None, end=None, connection=None):
+    """按帖子和评论重新生成 [start, end] 日期范围内的汇总，默认全部历史"""
+    post, comment = Post.__table__, Comment.__table__
+    post_conditions = [post.c.deleted == False]
+    comment_conditions = [post.c.deleted == False]
+    if start is not None:
+        post_conditions.append(post.c.created_at >= datetime.combine(start, datetime.min.time()))
+        comment_conditions.append(comment.c.created_at >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        post_conditions.append(post.c.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        comment_conditions.append(
+            comment.c.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+
+    activity = union_all(
+        select(post.c.section_id, func.date(post.c.created_at).label('day'), post.c.author_id,
+               literal(1).label('posts'), literal(0).label('comments'))
+        .where(*post_conditions),
+        select(post.c.section_id, func.date(comment.c.created_at).label('day'), comment.c.author_id,
+               literal(0).label('posts'), literal(1).label('comments'))
+        .select_from(comment.join(post, comment.c.post_id == post.c.id))
+        .where(*comment_conditions)
+    ).subquery()
+
+    statements = [
+        delete(author_table).where(*_day_range(author_table.c.day, start, end)),
+        delete(daily_table).where(*_day_range(daily_table.c.day, start, end)),
+        author_table.insert().from_select(
+            ['section_id', 'day', 'author_id', 'post_count', 'comment_count'],
+            select(activity.c.section_id, activity.c.day, activity.c.author_id,
+                   func.sum(activity.c.posts), func.sum(activity.c.comments))
+            .group_by(activity.c.section_id, activity.c.day, activity.c.author_id)
+        ),
+        daily_table.insert().from_select(
+            ['section_id', 'day', 'post_count', 'comment_count', 'author_count'],
+            select(author_table.c.section_id, author_table.c.day, func.sum(author_table.c.post_count),
+                   func.sum(author_table.c.comment_count), func.count())
+            .where(*_day_range(author_table.c.day, start, end))
+            .group_by(author_table.c.section_id, author_table.c.day)
+        )
+    ]
+    if connection is not None:
+        for statement in statements:
+            connection.execute(statement)
+    else:
+        for statement in statements:
+            db.session.execute(statement)
+        db.session.commit()
+
+
+def backfill_daily_stats(recent_days=None):
+    """汇总表为空时生成全部历史，否则只重新生成最近 recent_days 天（校准偏差）"""
+    if db.session.execute(select(daily_table.c.day).limit(1)).first() is None:
+        rebuild_daily_stats()
+    elif recent_days:
+        rebuild_daily_stats(start=datetime.utcnow().date() - timedelta(days=recent_days - 1))
+
+
+"""模型事件"""
+
+
+@event.listens_for(Post, 'after_insert')
+def _post_inserted(mapper, connection, target):
+    if not target.deleted:
+        _bump(connection, target.section_id, {(_day_of(target.created_at), target.author_id): (1, 0)})
+
+
+@event.listens_for(Post, 'after_update')
+def _post_updated(mapper, connection, target):
+    change = post_placement_change(target)
+    if change is None:
+        return
+    if change is PLACEMENT_UNKNOWN:
+        # 无法计算增量，重新生成帖子和评论涉及的日期
+        days = [day for day, _ in _post_contributions(connection, target, 1)]
+        rebuild_daily_stats(min(days), max(days), connection)
+        return
+    old_section, new_section = change
+    if old_section is not None:
+        _bump(connection, old_section, _post_contributions(connection, target, -1))
+    if new_section is not None:
+        _bump(connection, new_section, _post_contributions(connection, target, 1))
+
+
+@event.listens_for(Post, 'before_delete')
+def _post_deleted(mapper, connection, target):
+    # 会话中已加载的评论在此之前已经删除并各自扣减过，这里扣减帖子本身和剩下的评论
+    if not target.deleted:
+        _bump(connection, target.section_id, _post_contributions(connection, target, -1))
+
+
+@event.listens_for(Comment, 'after_insert')
+def _comment_inserted(mapper, connection, target):
+    _bump(connection, live_post_section(connection, target.post_id),
+          {(_day_of(target.created_at), target.author_id): (0, 1)})
+
+
+@event.listens_for(Comment, 'after_delete')
+def _comment_deleted(mapper, connection, target):
+    _bump(connection, live_post_section(connection, target.post_id),
+          {(_day_of(target.created_at), target.author_id): (0, -1)})
+
+
+"""板块分析查询"""
+
+
+def _bucket_of(day, days):
+    """日期范围较长时按周或按月合并趋势图的柱子"""
+    if days <= 31:
+        return day, day.strftime('%Y-%m-%d')
+    if days <= 120:
+        week = day - timedelta(days=day.weekday())
+        return week, week.strftime('%Y-%m-%d') + ' 起'
+    month = day.replace(day=1)
+    return month, month.strftime('%Y-%m')
+
+
+def activity_trend(start, end):
+    """日期范围内全站每天（或每周、每月）的发帖数和回复数"""
+    rows = db.session.execute(
+        select(daily_table.c.day, func.sum(daily_table.c.post_count), func.sum(daily_table.c.comment_count))
+        .where(daily_table.c.day >= start, daily_table.c.day <= end)
+        .group_by(daily_table.c.day)
+    ).all()
+    by_day = {day: (posts, comments) for day, posts, comments in rows}
+
+    days = (end - start).days + 1
+    buckets = {}
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        key, label = _bucket_of(day, days)
+        bucket = buckets.setdefault(key, {'date': label, 'count': 0, 'comments': 0})
+        posts, comments = by_day.get(day, (0, 0))
+        bucket['count'] += posts
+        bucket['comments'] += comments
+    return list(buckets.values())
+
+
+def section_activity(start=None, end=None):
+    """各板块在日期范围内（默认全部历史）的发帖数、回复数和活跃作者数，按发帖数排序"""
+    activity = select(
+        author_table.c.section_id,
+        func.sum(author_table.c.post_count).label('post_count'),
+        func.sum(author_table.c.comment_count).label('comment_count'),
+        func.count(author_table.c.author_id.distinct()).label('author_count')
+    ).where(*_day_range(author_table.c.day, start, end)) \
+        .group_by(author_table.c.section_id).subquery()
+    rows = db.session.execute(
+        select(Section.id, Section.name, Section.icon,
+               func.coalesce(activity.c.post_count, 0).label('post_count'),
+               func.coalesce(activity.c.comment_count, 0).label('comment_count'),
+               func.coalesce(activity.c.author_count, 0).label('author_count'))
+        .outerjoin(activity, activity.c.section_id == Section.id)
+        .order_by(func.coalesce(activity.c.post_count, 0).desc(), Section.id)
+    ).all()
+    return [row._asdict() for row in rows]
+
+
+def top_authors(start=None, end=None, limit=5):
+    """
+    每个板块日期范围内（默认全部历史）发帖最多的作者，
+    返回 {板块 id: [{'username', 'post_count', 'comment_count'}]}
+    """
+    totals = select(
+        author_table.c.section_id,
+        author_table.c.author_id,
+        func.sum(author_table.c.post_count).label('post_count'),
+        func.sum(author_table.c.comment_count).label('comment_count')
+    ).where(*_day_range(author_table.c.day, start, end)) \
+        .group_by(author_table.c.section_id, author_table.c.author_id).subquery()
+    ranked = select(
+        totals,
+        func.row_number().over(
+            partition_by=totals.c.section_id,
+            order_by=(totals.c.post_count.desc(), totals.c.comment_count.desc(), totals.c.author_id)
+        ).label('rank')
+    ).where(totals.c.post_count > 0).subquery()
+    rows = db.session.execute(
+        select(ranked.c.section_id, User.username, ranked.c.post_count, ranked.c.comment_count)
+        .join(User, User.id == ranked.c.author_id)
+        .where(ranked.c.rank <= limit)
+        .order_by(ranked.c.section_id, ranked.c.rank)
+    ).all()
+    result = {}
+    for section_id, username, post_count, comment_count in rows:
+        result.setdefault(section_id, []).append(
+            {'username': username, 'post_count': post_count, 'comment_count': comment_count}
+        )
+    return result
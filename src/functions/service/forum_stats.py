@@ -0,0 +1,140 @@
+"""
+论坛统计（主题数、消息数、用户数、最新用户）
+首次使用时查询一次后保存在内存中，之后由 SQLAlchemy 事件在提交后增量更新，
+渲染页面时不再查询数据库；批量 UPDATE/DELETE 等绕过 ORM 事件的修改由定时任务校准
+"""
+import threading
+from collections import Counter
+
+from sqlalchemy import event, inspect, func, select
+from sqlalchemy.orm import Session
+
+from src.db_ext import db
+from src.functions.database.models import Post, Comment, User
+
+
+class ForumStats:
+    def __init__(self):
+        self._stats = None
+        self._latest_user_id = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """重新统计全部数据"""
+        topics = db.session.execute(select(func.count()).select_from(Post).where(Post.deleted == False)).scalar()
+        messages = db.session.execute(
+            select(func.count()).select_from(Comment).where(Comment.deleted == False)
+        ).scalar()
+        users = db.session.execute(select(func.count()).select_from(User)).scalar()
+        latest = db.session.execute(select(User.id, User.username).order_by(User.id.desc()).limit(1)).first()
+        with self._lock:
+            self._stats = {
+                'topics': topics,
+                'messages': messages,
+                'users': users,
+                'latest_user': latest.username if latest else "暂无用户"
+            }
+            self._latest_user_id = latest.id if latest else None
+        return dict(self._stats)
+
+    def get(self):
+        stats = self._stats
+        if stats is None:
+            return self.refresh()
+        return dict(stats)
+
+    def invalidate(self):
+        with self._lock:
+            self._stats = None
+
+    def apply(self, deltas, new_users):
+        with self._lock:
+            if self._stats is None:
+                return
+            for key, delta in deltas.items():
+                self._stats[key] += delta
+            for user_id, username in new_users:
+                if self._latest_user_id is None or user_id > self._latest_user_id:
+                    self._latest_user_id = user_id
+                    self._stats['latest_user'] = username
+
+
+forum_stats = ForumStats()
+
+_COUNTED_MODELS = {Post: 'topics', Comment: 'messages'}
+
+
+def _pending(target):
+    session = inspect(target).session
+    if session is None:
+        return None
+    return session.info.setdefault('forum_stats', {'deltas': Counter(), 'new_users': [], 'stale': False})
+
+
+@event.listens_for(Post, 'after_insert')
+@event.listens_for(Comment, 'after_insert')
+def _counted_inserted(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None and not target.deleted:
+        pending['deltas'][_COUNTED_MODELS[type(target)]] += 1
+
+
+@event.listens_for(Post, 'after_update')
+@event.listens_for(Comment, 'after_update')
+def _counted_updated(mapper, connection, target):
+    history = inspect(target).attrs.deleted.history
+    if not history.has_changes():
+        return
+    pending = _pending(target)
+    if pending is None:
+        return
+    if not history.deleted:
+        # 修改前的值没有加载过，无法判断是否变化，重新统计
+        pending['stale'] = True
+    elif bool(history.deleted[0]) != bool(target.deleted):
+        pending['deltas'][_COUNTED_MODELS[type(target)]] += -1 if target.deleted else 1
+
+
+@event.listens_for(Post, 'after_delete')
+@event.listens_for(Comment, 'after_delete')
+def _counted_deleted(mapper, connection, target):
+    pending = _pending(target)
+    if pending is None:
+        return
+    if not target.deleted:
+        pending['deltas'][_COUNTED_MODELS[type(target)]] -= 1
+    if type(target) is Post:
+        # 评论由数据库级联删除，不会触发评论自身的事件，交给下次读取时重新统计
+        pending['stale'] = True
+
+
+@event.listens_for(User, 'after_insert')
+def _user_inserted(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending['deltas']['users'] += 1
+        pending['new_users'].append((target.id, target.username))
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        # 删除的可能是最新用户，重新统计
+        pending['stale'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_after_commit(session):
+    pending = session.info.pop('forum_stats', None)
+    if pending is None:
+        return
+    if pending['stale']:
+        forum_stats.invalidate()
+    else:
+        forum_stats.apply(pending['deltas'], pending['new_users'])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('forum_stats', None)
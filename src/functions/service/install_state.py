@@ -0,0 +1,95 @@
+"""
+论坛安装状态
+启动后只查询一次数据库，结果保存在进程内，并同步 instance 目录下的标记文件（已安装时写入，未安装时删除）；
+其他工作进程未安装时检查该文件即可得知安装已完成，请求路径上不再需要 COUNT 用户表
+"""
+import os
+import threading
+
+from sqlalchemy.exc import OperationalError
+
+from src.db_ext import db
+from src.functions.database.models import InstallationStatus, User
+
+MARKER_NAME = 'installed'
+
+
+class InstallState:
+    def __init__(self):
+        self.marker_path = None
+        self._installed = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.marker_path = os.path.join(app.instance_path, MARKER_NAME)
+
+    def load(self):
+        """
+        根据数据库确定安装状态并同步标记文件，需要在应用上下文中调用；
+        数据库被重置后遗留的标记文件会被删除，不会跳过安装
+        """
+        installed = self._database_installed()
+        if installed:
+            self._write_marker()
+        else:
+            self._remove_marker()
+        with self._lock:
+            self._installed = installed
+        return installed
+
+    @staticmethod
+    def _database_installed():
+        """安装状态表或用户表任意一个表明已安装即视为已安装，两个表都查询失败时视为未安装"""
+        try:
+            status = InstallationStatus.query.first()
+            if status and status.is_installed:
+                return True
+        except OperationalError:
+            # 安装状态表不存在，回滚后继续检查用户表
+            db.session.rollback()
+        try:
+            # 旧版本安装时没有记录安装状态，有用户即视为已安装
+            return db.session.query(User.id).limit(1).first() is not None
+        except OperationalError:
+            # 数据库还没有建表
+            db.session.rollback()
+            return False
+
+    @property
+    def installed(self):
+        if self._installed:
+            return True
+        if self._installed is None:
+            return self.load()
+        # 尚未安装时检查标记文件，其他进程可能已经完成安装
+        if self._marker_exists():
+            with self._lock:
+                self._installed = True
+            return True
+        return False
+
+    def mark_installed(self):
+        self._write_marker()
+        with self._lock:
+            self._installed = True
+
+    def _marker_exists(self):
+        return self.marker_path is not None and os.path.exists(self.marker_path)
+
+    def _remove_marker(self):
+        if self.marker_path is None:
+            return
+        try:
+            os.remove(self.marker_path)
+        except FileNotFoundError:
+            pass
+
+    def _write_marker(self):
+        if self.marker_path is None:
+            return
+        os.makedirs(os.path.dirname(self.marker_path), exist_ok=True)
+        with open(self.marker_path, 'w', encoding='utf-8') as f:
+            f.write('1\n')
+
+
+install_state = InstallState()
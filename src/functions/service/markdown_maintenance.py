@@ -0,0 +1,177 @@
+"""
+Markdown 渲染结果的维护任务
+"""
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select, update, bindparam
+
+from src.db_ext import db
+from src.functions.database.models import Post, Comment
+from src.functions.parser.markdown_parser import strip_injected_assets, render_markdown, make_excerpt, PARSER_VERSION
+from src.functions.service.render_queue import RENDER_DONE
+
+RERENDER_CHECKPOINT_PATH = 'instance/rerender_checkpoint.json'
+
+
+def strip_stored_assets(batch_size=500, log=print):
+    """
+    按 ID 分批去掉帖子和评论 html_content 开头由旧版本解析器注入的 <head> 资源，
+    每批提交一次，返回 {表名: 修改行数}
+    """
+    stripped = {}
+    for model in (Post, Comment):
+        table = model.__table__
+        statement = update(table).where(table.c.id == bindparam('row_id')).values(html_content=bindparam('html'))
+        changed = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(table.c.id, table.c.html_content)
+                .where(table.c.id > last_id, table.c.html_content.like('%<head>%'))
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            params = []
+            for row in rows:
+                html = strip_injected_assets(row.html_content)
+                if html != row.html_content:
+                    params.append({'row_id': row.id, 'html': html})
+            if params:
+                db.session.execute(statement, params)
+            db.session.commit()
+
+            changed += len(params)
+            last_id = rows[-1].id
+            log(f"{table.name}: 已处理到 ID {last_id}，累计清理 {changed} 条")
+        stripped[table.name] = changed
+    return stripped
+
+
+def backfill_excerpts(batch_size=500, log=print):
+    """为还没有摘要的帖子（摘要列加入之前发布的）按 ID 分批生成摘要，返回更新的行数"""
+    table = Post.__table__
+    statement = update(table).where(table.c.id == bindparam('row_id')).values(excerpt=bindparam('text'))
+    filled = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, table.c.content)
+            .where(table.c.id > last_id, table.c.excerpt.is_(None))
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        db.session.execute(statement, [{'row_id': row.id, 'text': make_excerpt(row.content)} for row in rows])
+        db.session.commit()
+
+        filled += len(rows)
+        last_id = rows[-1].id
+        log(f"post: 已处理到 ID {last_id}，累计生成 {filled} 条摘要")
+    return filled
+
+
+def _render_chunk(rows):
+    """在工作进程中渲染一批 (id, content, html_content)，只返回结果有变化的行，连同读取时的内容用于写回时比对"""
+    changed = []
+    for row_id, content, html_content in rows:
+        html = render_markdown(content)
+        if html != html_content:
+            changed.append({'row_id': row_id, 'read_content': content, 'html': html})
+    return rows[-1][0], len(rows), changed
+
+
+def _load_checkpoint(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # 解析器版本变化后旧的进度没有意义，从头开始
+    if checkpoint.get('parser_version') != PARSER_VERSION:
+        return {}
+    return checkpoint.get('last_ids', {})
+
+
+def _save_checkpoint(path, last_ids):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'parser_version': PARSER_VERSION, 'last_ids': last_ids}, f)
+    os.replace(temp_path, path)
+
+
+def _iter_chunks(table, last_id, batch_size):
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, table.c.content, table.c.html_content)
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield [tuple(row) for row in rows]
+
+
+def rerender_stored_html(batch_size=500, workers=None, checkpoint_path=RERENDER_CHECKPOINT_PATH, restart=False,
+                         log=print):
+    """
+    用当前解析器重新渲染所有帖子和评论的 html_content
+    按 ID 分批读取，交给进程池并行渲染，同时在途的批次不超过工作进程数的两倍；
+    结果按读取顺序批量写回并提交，每批提交后记录检查点，中断后再次运行会从检查点继续；
+    读取后被再次编辑的行不覆盖，由编辑时的渲染处理
+    返回 {表名: (处理行数, 更新行数)}
+    """
+    last_ids = {} if restart else _load_checkpoint(checkpoint_path)
+    workers = workers or os.cpu_count() or 1
+    summary = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for model in (Post, Comment):
+            table = model.__table__
+            statement = update(table).where(
+                table.c.id == bindparam('row_id'), table.c.content == bindparam('read_content')
+            ).values(html_content=bindparam('html'), render_state=RENDER_DONE)
+            processed = updated = 0
+            started = time.monotonic()
+            pending = deque()
+            chunks = _iter_chunks(table, last_ids.get(table.name, 0), batch_size)
+
+            def write_result(future):
+                nonlocal processed, updated
+                chunk_last_id, count, changed = future.result()
+                written = db.session.execute(statement, changed).rowcount if changed else 0
+                db.session.commit()
+                last_ids[table.name] = chunk_last_id
+                _save_checkpoint(checkpoint_path, last_ids)
+
+                processed += count
+                updated += written
+                elapsed = time.monotonic() - started
+                log(f"{table.name}: 已处理到 ID {chunk_last_id}，累计 {processed} 行，更新 {updated} 行，"
+                    f"{processed / elapsed if elapsed else 0:.0f} 行/秒")
+
+            for chunk in chunks:
+                pending.append(executor.submit(_render_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    write_result(pending.popleft())
+            while pending:
+                write_result(pending.popleft())
+
+            summary[table.name] = (processed, updated)
+
+    # 全部完成后清除检查点，下次运行从头开始
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return summary
@@ -1,6 +1,6 @@
 from flask import flash, g, redirect, url_for, request, render_template, abort, jsonify
 from src.functions.database.models import Post, db, Comment, Section
-from src.functions.parser.markdown_parser import convert_markdown_to_html
+from src.functions.service.render_queue import render_queue, RENDER_PENDING
 from src.functions.service.user_operations import get_comment_replies_summary
 
 
@@ -22,11 +22,12 @@ def create_post_logic():
             flash('请选择板块后才能发布帖子', 'danger')  # 提示用户选择板块
             return render_template('post/post.html', sections=sections)  # 返回到发帖页面并传递板块信息
 
-        html_content = convert_markdown_to_html(content)
+        html_content, render_state = render_queue.render(content)
         new_post = Post(
             title=title,
             content=content,
             html_content=html_content,
+            render_state=render_state,
             author_id=g.user.id,
             section_id=section_id  # 显式设置 section_id
         )
@@ -69,10 +70,11 @@ def view_post_logic(post_id):
             flash('评论内容不能为空', 'danger')
             return redirect(url_for('view_post', post_id=post.id))
 
-        html_content = convert_markdown_to_html(content)
+        html_content, render_state = render_queue.render(content)
         new_comment = Comment(
             content=content,
             html_content=html_content,
+            render_state=render_state,
             author_id=g.user.id,
             post_id=post.id
         )
@@ -86,4 +88,11 @@ def view_post_logic(post_id):
             return redirect(url_for('view_post', post_id=post.id))
 
     comments = Comment.query.filter_by(post_id=post.id, deleted=False).all()
+
+    # 异步渲染尚未完成（例如进程重启后任务丢失）时重新加入队列
+    if post.render_state == RENDER_PENDING:
+        render_queue.enqueue(Post, post.id)
+    for comment in comments:
+        if comment.render_state == RENDER_PENDING:
+            render_queue.enqueue(Comment, comment.id)
     return render_template('post/view_post.html', post=post, comments=comments, section=section, get_comment_replies_summary=get_comment_replies_summary)
\ No newline at end of file
@@ -0,0 +1,165 @@
+"""
+在线用户统计
+每个请求把访问者记入当前分钟的桶：登录用户按 UID 记录，游客按 IP 和 User-Agent 的哈希记录，
+最近 window_minutes 分钟内出现过的访问者视为在线；记录是 O(1) 操作，汇总在读取时计算并缓存几秒。
+默认使用进程内的分钟桶环形缓冲，多进程部署时可切换为 SQLite 文件后端以共享在线状态
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# 侧边栏最多列出的在线用户数，在线人数仍按全部用户统计
+USERS_LIST_LIMIT = 50
+
+
+def guest_token(remote_addr, user_agent):
+    """游客标识，只保存哈希值，不保存 IP"""
+    return hashlib.sha256(f'{remote_addr}|{user_agent}'.encode('utf-8')).hexdigest()[:16]
+
+
+def current_minute():
+    return int(time.time() // 60)
+
+
+class MemoryPresenceBackend:
+    """环形缓冲，每个槽位是一分钟内出现的 {UID: 用户名} 和游客标识集合"""
+    name = 'memory'
+
+    def __init__(self, window_minutes=5):
+        self.window_minutes = window_minutes
+        self._buckets = [(None, {}, set()) for _ in range(window_minutes)]
+        self._lock = threading.Lock()
+
+    def _bucket(self, minute):
+        index = minute % self.window_minutes
+        bucket = self._buckets[index]
+        if bucket[0] != minute:
+            bucket = (minute, {}, set())
+            self._buckets[index] = bucket
+        return bucket
+
+    def touch_user(self, user_uid, username):
+        with self._lock:
+            self._bucket(current_minute())[1][user_uid] = username
+
+    def touch_guest(self, token):
+        with self._lock:
+            self._bucket(current_minute())[2].add(token)
+
+    def collect(self):
+        """返回窗口内的 ({UID: 用户名}, 游客数)"""
+        oldest = current_minute() - self.window_minutes
+        users, guests = {}, set()
+        with self._lock:
+            for minute, bucket_users, bucket_guests in self._buckets:
+                if minute is not None and minute > oldest:
+                    users.update(bucket_users)
+                    guests |= bucket_guests
+        return users, len(guests)
+
+
+class SQLitePresenceBackend:
+    """基于本地 SQLite 文件的在线状态，同一台机器上的多个工作进程共享；每个访问者每分钟最多写入一次"""
+    name = 'sqlite'
+
+    def __init__(self, path='instance/presence.db', window_minutes=5):
+        self.path = path
+        self.window_minutes = window_minutes
+        self._written_minute = None
+        self._written = set()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS presence ('
+                'key TEXT PRIMARY KEY, user_uid INTEGER, username TEXT, minute INTEGER NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_presence_minute ON presence (minute)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _touch(self, key, user_uid, username):
+        minute = current_minute()
+        with self._lock:
+            if self._written_minute != minute:
+                self._written_minute = minute
+                self._written.clear()
+            if key in self._written:
+                return
+            self._written.add(key)
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO presence (key, user_uid, username, minute) VALUES (?, ?, ?, ?)',
+                (key, user_uid, username, minute)
+            )
+
+    def touch_user(self, user_uid, username):
+        self._touch(f'u:{user_uid}', user_uid, username)
+
+    def touch_guest(self, token):
+        self._touch(f'g:{token}', None, None)
+
+    def collect(self):
+        oldest = current_minute() - self.window_minutes
+        with self._connect() as conn:
+            conn.execute('DELETE FROM presence WHERE minute <= ?', (oldest,))
+            users = dict(conn.execute(
+                'SELECT user_uid, username FROM presence WHERE user_uid IS NOT NULL ORDER BY minute DESC'
+            ).fetchall())
+            guests = conn.execute('SELECT COUNT(*) FROM presence WHERE user_uid IS NULL').fetchone()[0]
+        return users, guests
+
+
+def create_backend(presence_config):
+    backend = presence_config.get('backend', 'memory')
+    window_minutes = presence_config.get('window_minutes', 5)
+    if backend == 'sqlite':
+        return SQLitePresenceBackend(presence_config.get('path', 'instance/presence.db'), window_minutes)
+    return MemoryPresenceBackend(window_minutes)
+
+
+class PresenceTracker:
+    def __init__(self, backend=None, cache_seconds=5):
+        self.backend = backend or MemoryPresenceBackend()
+        self.cache_seconds = cache_seconds
+        self._cached = None
+        self._lock = threading.Lock()
+
+    def configure(self, presence_config):
+        self.backend = create_backend(presence_config)
+        self.cache_seconds = presence_config.get('cache_seconds', self.cache_seconds)
+        self._cached = None
+
+    def touch(self, user, remote_addr, user_agent):
+        if user is not None:
+            self.backend.touch_user(user.user_uid, user.username)
+        else:
+            self.backend.touch_guest(guest_token(remote_addr, user_agent))
+
+    def snapshot(self):
+        now = time.monotonic()
+        cached = self._cached
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        with self._lock:
+            cached = self._cached
+            if cached is not None and cached[0] > now:
+                return cached[1]
+            users, guests = self.backend.collect()
+            online_users = {
+                'total': len(users) + guests,
+                'users': len(users),
+                'guests': guests,
+                'users_list': [{'user_uid': user_uid, 'username': username}
+                               for user_uid, username in list(users.items())[:USERS_LIST_LIMIT]]
+            }
+            self._cached = (now + self.cache_seconds, online_users)
+        return online_users
+
+
+presence_tracker = PresenceTracker()
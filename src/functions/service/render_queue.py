@@ -0,0 +1,129 @@
+"""
+Markdown 异步渲染队列
+开启后，超过长度阈值的帖子和评论保存时先写入转义后的简易 HTML 并标记为 rendering，
+提交后交给后台线程池渲染，完成后回写 html_content；页面在渲染完成前显示简易版本
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from markupsafe import escape
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from src.db_ext import db
+from src.functions.database.models import Post, Comment
+from src.functions.parser.markdown_parser import convert_markdown_to_html
+
+RENDER_DONE = 'done'
+RENDER_PENDING = 'rendering'
+
+logger = logging.getLogger(__name__)
+
+
+def render_fallback(content):
+    """渲染完成前显示的简易 HTML：只做转义，按空行分段、保留换行"""
+    paragraphs = [paragraph for paragraph in content.replace('\r\n', '\n').split('\n\n') if paragraph.strip()]
+    return ''.join('<p>' + str(escape(paragraph)).replace('\n', '<br>') + '</p>' for paragraph in paragraphs)
+
+
+class RenderQueue:
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.threshold = 20000
+        self.workers = 2
+        self._executor = None
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, queue_config):
+        self.app = app
+        self.enabled = queue_config.get('enabled', False)
+        self.threshold = queue_config.get('threshold', self.threshold)
+        self.workers = queue_config.get('workers', self.workers)
+
+    def render(self, content):
+        """返回保存时使用的 (html_content, render_state)"""
+        if self.enabled and self.app is not None and len(content) >= self.threshold:
+            return render_fallback(content), RENDER_PENDING
+        return convert_markdown_to_html(content), RENDER_DONE
+
+    def enqueue(self, model, row_id):
+        if self.app is None:
+            return False
+        key = (model.__tablename__, row_id)
+        with self._lock:
+            if key in self._in_flight:
+                return False
+            self._in_flight.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='markdown-render')
+        self._executor.submit(self._run, model, row_id, key)
+        return True
+
+    def _run(self, model, row_id, key):
+        try:
+            with self.app.app_context():
+                self.render_row(model, row_id)
+        except Exception:
+            logger.exception('Markdown 渲染失败：%s %s', *key)
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+    @staticmethod
+    def render_row(model, row_id):
+        table = model.__table__
+        content = db.session.execute(
+            select(table.c.content).where(table.c.id == row_id, table.c.render_state == RENDER_PENDING)
+        ).scalar()
+        if content is None:
+            return False
+
+        html = convert_markdown_to_html(content)
+        # 渲染期间内容被再次编辑时不覆盖，由新的任务处理
+        result = db.session.execute(
+            update(table)
+            .where(table.c.id == row_id, table.c.content == content, table.c.render_state == RENDER_PENDING)
+            .values(html_content=html, render_state=RENDER_DONE)
+        )
+        db.session.commit()
+        return result.rowcount > 0
+
+    def enqueue_pending(self, limit=100):
+        """把仍处于 rendering 状态的行加入队列，用于进程重启后的补偿"""
+        queued = 0
+        for model in (Post, Comment):
+            table = model.__table__
+            row_ids = db.session.execute(
+                select(table.c.id).where(table.c.render_state == RENDER_PENDING).order_by(table.c.id).limit(limit)
+            ).scalars()
+            queued += sum(self.enqueue(model, row_id) for row_id in row_ids)
+        return queued
+
+
+render_queue = RenderQueue()
+
+
+@event.listens_for(Post, 'after_insert')
+@event.listens_for(Post, 'after_update')
+@event.listens_for(Comment, 'after_insert')
+@event.listens_for(Comment, 'after_update')
+def _render_state_written(mapper, connection, target):
+    if target.render_state != RENDER_PENDING:
+        return
+    session = inspect(target).session
+    if session is not None:
+        session.info.setdefault('render_queue', set()).add((type(target), target.id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _enqueue_after_commit(session):
+    for model, row_id in session.info.pop('render_queue', ()):
+        render_queue.enqueue(model, row_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('render_queue', None)
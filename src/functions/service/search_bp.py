@@ -1,9 +1,32 @@
-from flask import Blueprint, request, render_template, jsonify
-from src.functions.service.search_logic import search_logic
+from flask import Blueprint, request, render_template, jsonify, g, abort, Response, stream_with_context
+from src.functions.service.search_cache import search_cache
+from src.functions.service.search_suggest import search_suggester
+from src.functions.service.user_cache import force_db_user
+from src.functions.service.search_logic import search_logic, iter_search_ndjson, decode_cursor, \
+    RESULT_LIMIT, MAX_RESULT_LIMIT
 
 # 创建蓝图
 search_bp = Blueprint('search_bp', __name__)
 
+
+def get_paging_args(keyword):
+    """从查询字符串读取 limit 以及 cursor / offset，游标无效时抛出 ValueError"""
+    limit = request.args.get('limit', RESULT_LIMIT, type=int)
+    limit = max(1, min(limit, MAX_RESULT_LIMIT))
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        offset = decode_cursor(keyword, cursor)
+    else:
+        offset = max(0, request.args.get('offset', 0, type=int))
+    return limit, offset
+
+
+def wants_stream():
+    return request.args.get('stream') in ('1', 'true') or \
+        'application/x-ndjson' in request.headers.get('Accept', '')
+
+
 # 定义搜索API路由
 @search_bp.route('/api/search', methods=['GET'])
 def api_search():
@@ -11,9 +34,36 @@ def api_search():
     if not keyword:
         return jsonify({'success': False, 'message': '未提供搜索关键词'})
 
-    results = search_logic(keyword)
+    try:
+        limit, offset = get_paging_args(keyword)
+    except ValueError:
+        return jsonify({'success': False, 'message': '无效的分页游标'}), 400
+
+    # 流式模式下边打分边输出，客户端可以先渲染已有结果
+    if wants_stream():
+        return Response(
+            stream_with_context(iter_search_ndjson(keyword, limit, offset)),
+            mimetype='application/x-ndjson'
+        )
+
+    results = search_logic(keyword, limit, offset)
     return jsonify(results)
 
+# 搜索联想（前缀匹配关键词和帖子标题）
+@search_bp.route('/api/search/suggest', methods=['GET'])
+def api_search_suggest():
+    prefix = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 8, type=int), 20))
+    return jsonify({'success': True, 'suggestions': search_suggester.suggest(prefix, limit)})
+
+# 搜索缓存命中统计，用于调整缓存容量
+@search_bp.route('/api/search/cache_stats', methods=['GET'])
+@force_db_user
+def api_search_cache_stats():
+    if g.role != 'admin':
+        abort(403)
+    return jsonify(search_cache.stats())
+
 # 定义搜索页面路由
 @search_bp.route('/search', methods=['GET'])
 def search_page():
@@ -21,5 +71,17 @@ def search_page():
     if not keyword:
         return render_template('search.html', results=None, keyword=None)
 
-    results = search_logic(keyword)
-    return render_template('search.html', results=results.get('results'), keyword=keyword)
\ No newline at end of file
+    try:
+        limit, offset = get_paging_args(keyword)
+    except ValueError:
+        limit, offset = RESULT_LIMIT, 0
+
+    results = search_logic(keyword, limit, offset)
+    return render_template(
+        'search.html',
+        results=results.get('results'),
+        keyword=keyword,
+        limit=limit,
+        offset=offset,
+        next_cursor=results.get('next_cursor')
+    )
@@ -0,0 +1,210 @@
+"""
+搜索结果缓存
+以规范化后的关键词为键缓存 search_logic 的结果，帖子或评论写入时通过 SQLAlchemy 事件失效
+默认使用进程内 LRU + TTL 缓存，多进程部署时可切换为 SQLite 文件后端以共享缓存和失效
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from src.functions.database.models import Post, Comment, SearchModel
+
+
+class MemoryCacheBackend:
+    name = 'memory'
+
+    def __init__(self, max_size=256, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCacheBackend:
+    """基于本地 SQLite 文件的缓存，同一台机器上的多个工作进程共享"""
+    name = 'sqlite'
+
+    def __init__(self, path='instance/search_cache.db', max_size=1024, ttl=300):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS search_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_search_cache_accessed_at ON search_cache (accessed_at)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT value FROM search_cache WHERE key = ? AND expires_at >= ?', (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE search_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO search_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), now + self.ttl, now)
+            )
+            conn.execute(
+                'DELETE FROM search_cache WHERE expires_at < ? OR key IN ('
+                'SELECT key FROM search_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (now, self.max_size)
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM search_cache')
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM search_cache').fetchone()[0]
+
+
+def create_backend(cache_config):
+    backend = cache_config.get('backend', 'memory')
+    max_size = cache_config.get('max_size', 256)
+    ttl = cache_config.get('ttl', 300)
+    if backend == 'sqlite':
+        return SQLiteCacheBackend(cache_config.get('path', 'instance/search_cache.db'), max_size, ttl)
+    return MemoryCacheBackend(max_size, ttl)
+
+
+class SearchCache:
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryCacheBackend()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def configure(self, cache_config):
+        self.backend = create_backend(cache_config)
+
+    @staticmethod
+    def normalize(keywords):
+        return ' '.join(keywords.casefold().split())
+
+    def get(self, keywords):
+        value = self.backend.get(self.normalize(keywords))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, keywords, value):
+        self.backend.set(self.normalize(keywords), value)
+
+    def get_or_compute(self, keywords, compute):
+        value = self.get(keywords)
+        if value is None:
+            value = compute()
+            self.set(keywords, value)
+        return value
+
+    def invalidate(self):
+        self.invalidations += 1
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.backend.name,
+            'size': len(self.backend),
+            'max_size': self.backend.max_size,
+            'ttl': self.backend.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'invalidations': self.invalidations
+        }
+
+
+search_cache = SearchCache()
+
+# 这些字段变化才会影响搜索结果，浏览数、点赞数的更新不触发失效
+_SEARCHABLE_ATTRIBUTES = ('title', 'content', 'author_id', 'post_id', 'deleted', 'keyword')
+
+
+def _mark_session(target):
+    session = inspect(target).session
+    if session is not None:
+        session.info['search_cache_dirty'] = True
+
+
+@event.listens_for(Post, 'after_insert')
+@event.listens_for(Post, 'after_delete')
+@event.listens_for(Comment, 'after_insert')
+@event.listens_for(Comment, 'after_delete')
+@event.listens_for(SearchModel, 'after_insert')
+@event.listens_for(SearchModel, 'after_delete')
+def _search_source_changed(mapper, connection, target):
+    search_cache.invalidate()
+    _mark_session(target)
+
+
+@event.listens_for(Post, 'after_update')
+@event.listens_for(Comment, 'after_update')
+@event.listens_for(SearchModel, 'after_update')
+def _search_source_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(name in state.attrs and state.attrs[name].history.has_changes() for name in _SEARCHABLE_ATTRIBUTES):
+        search_cache.invalidate()
+        _mark_session(target)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    # 刷新到提交之间其他请求可能把旧数据重新写入缓存，提交后再失效一次
+    if session.info.pop('search_cache_dirty', False):
+        search_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('search_cache_dirty', None)
@@ -0,0 +1,330 @@
+"""
+搜索倒排索引
+帖子和评论在写入时同步维护 词元 -> 文档 的倒排表，搜索时直接查表并按 BM25 打分，
+避免每次请求都扫描全部帖子和评论
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from sqlalchemy import event, select, insert, update, delete, inspect, or_, and_
+
+from src.db_ext import db
+from src.functions.database.models import Post, Comment, User, SearchDocument, SearchPosting, SearchFieldStat, \
+    SearchIndexMeta
+from src.functions.service.search_cache import search_cache
+from src.functions.service.search_tokenizer import tokenize, tokenizer_signature, is_cjk_unigram
+
+# 索引字段与搜索结果中展示的来源名称
+FIELD_SOURCES = {
+    'post_title': '帖子标题',
+    'post_content': '帖子内容',
+    'post_author': '作者',
+    'comment_content': '评论内容',
+    'comment_author': '评论作者'
+}
+POST_FIELDS = ('post_title', 'post_content', 'post_author')
+COMMENT_FIELDS = ('comment_content', 'comment_author')
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+PREVIEW_LENGTH = 100
+
+_documents = SearchDocument.__table__
+_postings = SearchPosting.__table__
+_field_stats = SearchFieldStat.__table__
+_index_meta = SearchIndexMeta.__table__
+
+
+def make_preview(text):
+    return text[:PREVIEW_LENGTH] + "..." if len(text) > PREVIEW_LENGTH else text
+
+
+def _update_field_stat(connection, field, doc_delta, length_delta):
+    result = connection.execute(
+        update(_field_stats).where(_field_stats.c.field == field).values(
+            doc_count=_field_stats.c.doc_count + doc_delta,
+            total_length=_field_stats.c.total_length + length_delta
+        )
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(_field_stats).values(
+            field=field,
+            doc_count=max(doc_delta, 0),
+            total_length=max(length_delta, 0)
+        ))
+
+
+def _add_document(connection, field, source_id, post_id, comment_id, text):
+    tokens = tokenize(text)
+    if not tokens:
+        return
+
+    result = connection.execute(insert(_documents).values(
+        field=field,
+        source_id=source_id,
+        post_id=post_id,
+        comment_id=comment_id,
+        preview=make_preview(text),
+        tokens=' '.join(tokens),
+        length=len(tokens)
+    ))
+    document_id = result.inserted_primary_key[0]
+    connection.execute(insert(_postings), [
+        {'term': term, 'document_id': document_id, 'tf': tf}
+        for term, tf in Counter(tokens).items()
+    ])
+    _update_field_stat(connection, field, 1, len(tokens))
+
+
+def _remove_documents(connection, *criteria):
+    rows = connection.execute(
+        select(_documents.c.id, _documents.c.field, _documents.c.length).where(*criteria)
+    ).all()
+    if not rows:
+        return
+
+    document_ids = [row.id for row in rows]
+    connection.execute(delete(_postings).where(_postings.c.document_id.in_(document_ids)))
+    connection.execute(delete(_documents).where(_documents.c.id.in_(document_ids)))
+
+    removed = defaultdict(lambda: [0, 0])
+    for row in rows:
+        removed[row.field][0] += 1
+        removed[row.field][1] += row.length
+    for field, (doc_count, total_length) in removed.items():
+        _update_field_stat(connection, field, -doc_count, -total_length)
+
+
+def remove_post_documents(connection, post_ids):
+    """删除这些帖子以及其下评论的全部索引文档，用于绕过 ORM 事件的批量删除"""
+    _remove_documents(connection, _documents.c.post_id.in_(post_ids))
+
+
+def _get_username(connection, user_id):
+    return connection.execute(select(User.username).where(User.id == user_id)).scalar()
+
+
+def index_post(connection, post_id, title, content, author):
+    _remove_documents(connection, _documents.c.field.in_(POST_FIELDS), _documents.c.source_id == post_id)
+    _add_document(connection, 'post_title', post_id, post_id, None, title)
+    _add_document(connection, 'post_content', post_id, post_id, None, content)
+    _add_document(connection, 'post_author', post_id, post_id, None, author)
+
+
+def index_comment(connection, comment_id, post_id, content, author):
+    _remove_documents(connection, _documents.c.field.in_(COMMENT_FIELDS), _documents.c.source_id == comment_id)
+    _add_document(connection, 'comment_content', comment_id, post_id, comment_id, content)
+    _add_document(connection, 'comment_author', comment_id, post_id, comment_id, author)
+
+
+def _has_changes(target, *names):
+    state = inspect(target)
+    return any(state.attrs[name].history.has_changes() for name in names)
+
+
+@event.listens_for(Post, 'after_insert')
+def _post_inserted(mapper, connection, target):
+    if not target.deleted:
+        index_post(connection, target.id, target.title, target.content, _get_username(connection, target.author_id))
+
+
+@event.listens_for(Post, 'after_update')
+def _post_updated(mapper, connection, target):
+    if not _has_changes(target, 'title', 'content', 'author_id', 'deleted'):
+        return
+    if target.deleted:
+        _remove_documents(connection, _documents.c.field.in_(POST_FIELDS), _documents.c.source_id == target.id)
+    else:
+        index_post(connection, target.id, target.title, target.content, _get_username(connection, target.author_id))
+
+
+@event.listens_for(Post, 'after_delete')
+def _post_deleted(mapper, connection, target):
+    # 评论可能由数据库级联删除，不会触发评论自身的事件，这里一并清理
+    _remove_documents(connection, _documents.c.post_id == target.id)
+
+
+@event.listens_for(Comment, 'after_insert')
+def _comment_inserted(mapper, connection, target):
+    if not target.deleted:
+        index_comment(connection, target.id, target.post_id, target.content,
+                      _get_username(connection, target.author_id))
+
+
+@event.listens_for(Comment, 'after_update')
+def _comment_updated(mapper, connection, target):
+    if not _has_changes(target, 'content', 'author_id', 'post_id', 'deleted'):
+        return
+    if target.deleted:
+        _remove_documents(connection, _documents.c.field.in_(COMMENT_FIELDS), _documents.c.source_id == target.id)
+    else:
+        index_comment(connection, target.id, target.post_id, target.content,
+                      _get_username(connection, target.author_id))
+
+
+@event.listens_for(Comment, 'after_delete')
+def _comment_deleted(mapper, connection, target):
+    _remove_documents(connection, _documents.c.field.in_(COMMENT_FIELDS), _documents.c.source_id == target.id)
+
+
+def rebuild_search_index(batch_size=500):
+    """清空并重建整个倒排索引，返回被索引的帖子和评论数量"""
+    connection = db.session.connection()
+    connection.execute(delete(_postings))
+    connection.execute(delete(_documents))
+    connection.execute(delete(_field_stats))
+    connection.execute(delete(_index_meta).where(_index_meta.c.key == 'tokenizer'))
+    connection.execute(insert(_index_meta).values(key='tokenizer', value=tokenizer_signature()))
+
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(Post.id, Post.title, Post.content, User.username)
+            .join(User, User.id == Post.author_id)
+            .where(Post.deleted == False, Post.id > last_id)
+            .order_by(Post.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            index_post(connection, row.id, row.title, row.content, row.username)
+        indexed += len(rows)
+        last_id = rows[-1].id
+
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(Comment.id, Comment.post_id, Comment.content, User.username)
+            .join(User, User.id == Comment.author_id)
+            .where(Comment.deleted == False, Comment.id > last_id)
+            .order_by(Comment.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            index_comment(connection, row.id, row.post_id, row.content, row.username)
+        indexed += len(rows)
+        last_id = rows[-1].id
+
+    db.session.commit()
+    search_cache.invalidate()
+    return indexed
+
+
+def ensure_search_index():
+    """
+    启动时检查索引：旧版本的索引表缺少词元列时重建表结构；
+    分词器发生变化，或索引为空但已有帖子时（例如旧版本升级上来）重建索引
+    """
+    inspector = inspect(db.engine)
+    if inspector.has_table(_documents.name) and \
+            'tokens' not in {column['name'] for column in inspector.get_columns(_documents.name)}:
+        for table in (_postings, _documents, _field_stats):
+            table.drop(db.engine, checkfirst=True)
+    db.metadata.create_all(db.engine, tables=[_documents, _postings, _field_stats, _index_meta])
+
+    signature = db.session.execute(
+        select(_index_meta.c.value).where(_index_meta.c.key == 'tokenizer')
+    ).scalar()
+    if signature != tokenizer_signature() or (
+            db.session.query(SearchDocument.id).first() is None and
+            db.session.query(Post.id).filter_by(deleted=False).first() is not None):
+        return rebuild_search_index()
+    return 0
+
+
+def _term_condition(terms):
+    """
+    词元的查询条件：单个汉字在索引中只以二元组的首字出现，
+    按前缀范围 term >= '蓝' AND term < '蓝\\uffff' 匹配，利用词元主键做范围扫描
+    """
+    conditions = [_postings.c.term.in_(terms)]
+    conditions.extend(
+        and_(_postings.c.term >= term, _postings.c.term < term + '\uffff')
+        for term in terms if is_cjk_unigram(term)
+    )
+    return or_(*conditions)
+
+
+def _query_terms(term, terms):
+    """索引词元对应的查询词元：完全相同，或以单个汉字查询词元开头"""
+    return [query_term for query_term in terms
+            if term == query_term or (is_cjk_unigram(query_term) and term.startswith(query_term))]
+
+
+def query_index(keywords, per_field=5):
+    """
+    在倒排索引中查找关键词，返回 {来源名称: [匹配结果]}，每个字段最多 per_field 条
+    相似度为 BM25 得分相对于“每个词元恰好出现一次的平均长度文档”得分的比例，截断到 1
+    """
+    terms = list(dict.fromkeys(tokenize(keywords)))
+    if not terms:
+        return {}
+
+    stats = {row.field: row for row in db.session.execute(select(_field_stats)).all()}
+    rows = db.session.execute(
+        select(_postings.c.term, _postings.c.tf, _documents.c.id, _documents.c.field, _documents.c.length)
+        .join(_documents, _documents.c.id == _postings.c.document_id)
+        .where(_term_condition(terms))
+    ).all()
+    if not rows:
+        return {}
+
+    # 前缀匹配时一个查询词元可能对应同一文档中的多个二元组，词频合并计算
+    term_freq = Counter()
+    lengths = {}
+    for row in rows:
+        for query_term in _query_terms(row.term, terms):
+            term_freq[(row.field, row.id, query_term)] += row.tf
+        lengths[row.id] = row.length
+
+    document_freq = Counter((field, query_term) for field, _, query_term in term_freq)
+
+    def idf(field, term):
+        doc_count = stats[field].doc_count if field in stats else 0
+        df = document_freq.get((field, term), 0)
+        return math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+    scores = defaultdict(float)
+    for (field, document_id, query_term), tf in term_freq.items():
+        stat = stats.get(field)
+        avg_length = stat.total_length / stat.doc_count if stat and stat.doc_count else 1
+        tf_norm = tf * (BM25_K1 + 1) / (
+            tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths[document_id] / avg_length)
+        )
+        scores[(field, document_id)] += idf(field, query_term) * tf_norm
+
+    by_field = defaultdict(list)
+    for (field, document_id), score in scores.items():
+        by_field[field].append((score, document_id))
+
+    top = {}
+    for field, candidates in by_field.items():
+        ideal = sum(idf(field, term) for term in terms) or 1
+        for score, document_id in heapq.nlargest(per_field, candidates):
+            top[document_id] = (field, min(score / ideal, 1.0))
+
+    documents = db.session.execute(
+        select(_documents).where(_documents.c.id.in_(list(top)))
+    ).all()
+
+    results = defaultdict(list)
+    for document in documents:
+        field, similarity = top[document.id]
+        results[FIELD_SOURCES[field]].append({
+            'content': document.preview,
+            'similarity': round(similarity, 2),
+            'source': FIELD_SOURCES[field],
+            'postId': document.post_id,
+            'commentId': document.comment_id,
+            'matchType': 'bm25'
+        })
+    for matches in results.values():
+        matches.sort(key=lambda x: x['similarity'], reverse=True)
+    return dict(results)
@@ -1,105 +1,246 @@
-from fuzzywuzzy import fuzz
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-
-from src.functions.database.models import SearchModel, Post, Comment
-
-
-def cosine_simulator(s1, s2):
-    vectorizer = TfidfVectorizer().fit_transform([s1, s2])
-    vectors = vectorizer.toarray()
-    return cosine_similarity(vectors)[0, 1]
-
-
-def find_matches(data_field, field_name, keywords, threshold):
-    matches = []
-    for item in data_field:
-        text = item.get('content') if field_name == '帖子内容' else item.get(
-            'title') if field_name == '帖子标题' else item.get('author') if field_name == '作者' else item.get('content')
-
-        cosine_sim = cosine_simulator(keywords, text) if text else 0.0
-        fuzzy_ratio = fuzz.token_sort_ratio(keywords, text) / 100.0 if text else 0.0
-
-        combined_score = max(cosine_sim, fuzzy_ratio)
-
-        if combined_score > threshold:
-            preview = text[:100] + "..." if len(text) > 100 else text
-            matches.append({
-                'content': preview,
-                'similarity': round(combined_score, 2),
-                'source': field_name,
-                'postId': item.get('id'),
-                'commentId': item.get('commentId'),
-                'matchType': 'fuzzy' if fuzzy_ratio > cosine_sim else 'cosine'
+import base64
+import binascii
+import heapq
+import json
+import zlib
+
+import numpy as np
+from rapidfuzz import fuzz, process, utils
+from sqlalchemy import select
+
+from src.db_ext import db
+from src.functions.database.models import SearchModel, Post, Comment, User
+from src.functions.service.search_cache import search_cache
+from src.functions.service.search_index import query_index
+
+# 搜索来源以及查询结果中的列下标
+POST_SOURCES = (
+    ('帖子标题', 1),
+    ('帖子内容', 2),
+    ('作者', 3)
+)
+COMMENT_SOURCES = (
+    ('评论内容', 2),
+    ('评论作者', 3)
+)
+
+PER_SOURCE_LIMIT = 5
+MAX_PER_SOURCE = 50
+RESULT_LIMIT = 20
+MAX_RESULT_LIMIT = 100
+STREAM_BATCH_SIZE = 500
+
+
+class TopK:
+    """容量固定的小顶堆，只保留得分最高的 k 个元素，得分相同时先入者优先"""
+
+    def __init__(self, k):
+        self.k = k
+        self.heap = []
+
+    def push(self, score, order, item):
+        entry = (score, -order, item)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+
+    def items(self):
+        return [item for _, _, item in sorted(self.heap, key=lambda entry: entry[:2], reverse=True)]
+
+
+def fuzzy_scores(keywords, texts, threshold):
+    """批量计算模糊匹配得分（0~1），低于阈值的记为 0"""
+    scores = process.cdist(
+        [keywords],
+        texts,
+        scorer=fuzz.token_sort_ratio,
+        processor=utils.default_process,
+        score_cutoff=threshold * 100,
+        workers=-1
+    )
+    return scores[0] / 100.0
+
+
+def score_batch(rows, sources, keywords, threshold, heaps, make_ids, order):
+    """对一批行的所有来源字段一起打分，并放入各来源的有界堆"""
+    for source, column in sources:
+        texts = [row[column] or '' for row in rows]
+        fuzzy = fuzzy_scores(keywords, texts, threshold)
+
+        for i in np.nonzero(fuzzy > threshold)[0]:
+            text = texts[i]
+            post_id, comment_id = make_ids(rows[i])
+            heaps[source].push(float(fuzzy[i]), order + i, {
+                'content': text[:100] + "..." if len(text) > 100 else text,
+                'similarity': round(float(fuzzy[i]), 2),
+                'source': source,
+                'postId': post_id,
+                'commentId': comment_id,
+                'matchType': 'fuzzy'
             })
-    return sorted(matches, key=lambda x: x['similarity'], reverse=True)[:5]
-
 
-def get_data():
-    posts = Post.query.filter_by(deleted=False).all()
-    comments = Comment.query.filter_by(deleted=False).all()
 
-    posts_data = [{
-        'id': post.id,
-        'title': post.title,
-        'content': post.content,
-        'author': post.author.username
-    } for post in posts]
+def iter_similarity_matches(keywords, threshold=0.2):
+    """
+    逐批读取数据库游标，一次遍历完成所有字段的相似度打分，不在内存中构造完整的帖子和评论列表
+    每处理完一批产生一次 (已扫描行数, 当前各来源的匹配结果)
+    """
+    heaps = {source: TopK(MAX_PER_SOURCE) for source, _ in POST_SOURCES + COMMENT_SOURCES}
+    order = 0
+
+    def current():
+        return {source: heap.items() for source, heap in heaps.items() if heap.heap}
+
+    posts = db.session.execute(
+        select(Post.id, Post.title, Post.content, User.username)
+        .join(User, User.id == Post.author_id)
+        .where(Post.deleted == False)
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    for rows in posts.partitions():
+        score_batch(rows, POST_SOURCES, keywords, threshold, heaps,
+                    lambda row: (row[0], None), order)
+        order += len(rows)
+        yield order, current()
+
+    comments = db.session.execute(
+        select(Comment.id, Comment.post_id, Comment.content, User.username)
+        .join(User, User.id == Comment.author_id)
+        .where(Comment.deleted == False)
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    for rows in comments.partitions():
+        score_batch(rows, COMMENT_SOURCES, keywords, threshold, heaps,
+                    lambda row: (row[1], row[0]), order)
+        order += len(rows)
+        yield order, current()
+
+    if order == 0:
+        yield order, {}
+
+
+def similarity_matches(keywords, threshold=0.2):
+    results = {}
+    for _, results in iter_similarity_matches(keywords, threshold):
+        pass
+    return results
+
+
+def merge_results(results):
+    """
+    合并各来源的结果：每个来源的前 PER_SOURCE_LIMIT 条为第一档，依次类推，
+    同档内按相似度排序，保证第一页与各来源各取前几条时的结果一致
+    """
+    merged = []
+    for result_type, matches in results.items():
+        for rank, match in enumerate(matches[:MAX_PER_SOURCE]):
+            merged.append((rank // PER_SOURCE_LIMIT, -match['similarity'], len(merged), {
+                'source': result_type,
+                'content': match['content'],
+                'similarity': match['similarity'],
+                'postId': match.get('postId'),  # 确保 postId 存在
+                'commentId': match.get('commentId')
+            }))
+    return [item for *_, item in sorted(merged, key=lambda entry: entry[:3])]
 
-    comments_data = [{
-        'id': comment.id,
-        'content': comment.content,
-        'author': comment.author.username,
-        'postId': comment.post.id
-    } for comment in comments]
 
-    return {
-        'posts': posts_data,
-        'comments': comments_data
-    }
+def build_response(results):
+    all_results = merge_results(results)
+    if all_results:
+        return {
+            'success': True,
+            'type': '内容匹配',
+            'results': all_results
+        }
+    return {'success': False, 'message': '未找到相关结果'}
 
 
-def search_logic(keywords):
-    if not keywords:
-        return {'success': False, 'message': '未提供搜索关键词'}
+def iter_search(keywords):
+    """
+    逐步执行搜索：相似度扫描过程中产生 ('progress', 已扫描行数, 当前排序结果)，
+    最后产生 ('done', 完整结果)，完整结果会写入缓存
+    """
+    response = search_cache.get(keywords)
+    if response is not None:
+        yield 'done', response
+        return
 
     keyword_results = SearchModel.query.filter(SearchModel.keyword.ilike(f'%{keywords}%')).all()
     if keyword_results:
-        return {
+        response = {
             'success': True,
             'type': '关键词匹配',
             'results': [{'keyword': k.keyword} for k in keyword_results]
         }
+    else:
+        results = query_index(keywords, per_field=MAX_PER_SOURCE)
+        if not results:
+            # 倒排索引没有命中时（如错别字），回退到逐条模糊匹配
+            for scanned, results in iter_similarity_matches(keywords):
+                yield 'progress', scanned, merge_results(results)
+        response = build_response(results)
 
-    data = get_data()
-    threshold = 0.2
+    search_cache.set(keywords, response)
+    yield 'done', response
 
-    results = {
-        '帖子标题': find_matches(data['posts'], '帖子标题', keywords, threshold),
-        '帖子内容': find_matches(data['posts'], '帖子内容', keywords, threshold),
-        '作者': find_matches(data['posts'], '作者', keywords, threshold),
-        '评论内容': find_matches(data['comments'], '评论内容', keywords, threshold),
-        '评论作者': find_matches(data['comments'], '评论作者', keywords, threshold)
-    }
 
-    all_results = []
-    for result_type, matches in results.items():
-        for match in matches:
-            all_results.append({
-                'source': result_type,
-                'content': match['content'],
-                'similarity': match['similarity'],
-                'postId': match.get('postId'),  # 确保 postId 存在
-                'commentId': match.get('commentId')
-            })
+def encode_cursor(keywords, offset):
+    payload = json.dumps({'k': zlib.crc32(search_cache.normalize(keywords).encode('utf-8')), 'o': offset})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
 
-    all_results = sorted(all_results, key=lambda x: x['similarity'], reverse=True)[:20]
 
-    if all_results:
-        return {
-            'success': True,
-            'type': '内容匹配',
-            'results': all_results
-        }
+def decode_cursor(keywords, cursor):
+    """解析游标得到偏移量，游标无效或不属于当前关键词时抛出 ValueError"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        key, offset = payload['k'], int(payload['o'])
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        raise ValueError('invalid cursor')
+    if key != zlib.crc32(search_cache.normalize(keywords).encode('utf-8')) or offset < 0:
+        raise ValueError('invalid cursor')
+    return offset
+
+
+def paginate_response(keywords, response, limit, offset):
+    if not response.get('success'):
+        return response
+
+    results = response['results']
+    end = offset + limit
+    return {
+        **response,
+        'results': results[offset:end],
+        'total': len(results),
+        'offset': offset,
+        'limit': limit,
+        'next_cursor': encode_cursor(keywords, end) if end < len(results) else None
+    }
+
+
+def search_logic(keywords, limit=RESULT_LIMIT, offset=0):
+    if not keywords:
+        return {'success': False, 'message': '未提供搜索关键词'}
 
-    return {'success': False, 'message': '未找到相关结果'}
\ No newline at end of file
+    for event_type, *payload in iter_search(keywords):
+        if event_type == 'done':
+            return paginate_response(keywords, payload[0], limit, offset)
+
+
+def iter_search_ndjson(keywords, limit=RESULT_LIMIT, offset=0):
+    """以 NDJSON 流式输出搜索：扫描进度、逐条结果，最后是分页信息"""
+    for event_type, *payload in iter_search(keywords):
+        if event_type == 'progress':
+            scanned, results = payload
+            yield json.dumps({
+                'event': 'progress',
+                'scanned': scanned,
+                'results': results[offset:offset + limit]
+            }, ensure_ascii=False) + '\n'
+            continue
+
+        response = paginate_response(keywords, payload[0], limit, offset)
+        for result in response.get('results', []):
+            yield json.dumps({'event': 'result', 'result': result}, ensure_ascii=False) + '\n'
+        summary = {key: value for key, value in response.items() if key != 'results'}
+        yield json.dumps({'event': 'end', **summary}, ensure_ascii=False) + '\n'
@@ -0,0 +1,173 @@
+"""
+搜索联想
+在内存中维护关键词和帖子标题的有序数组，输入前缀时用二分查找定位，
+只读取前 N 条，不再对数据库做无锚点的 LIKE 扫描；
+本进程的修改在提交后标记重建，其他进程的修改在刷新间隔到期后重建，重建在后台线程中进行，完成前继续使用旧数组
+"""
+import bisect
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from src.db_ext import db
+from src.functions.database.models import Post, SearchModel
+
+
+logger = logging.getLogger(__name__)
+
+
+class PrefixSuggester:
+    def __init__(self, refresh_seconds=60):
+        self.refresh_seconds = refresh_seconds
+        self._keywords = []  # (规范化关键词, 关键词)
+        self._titles = []  # (规范化标题, 帖子 ID, 标题)
+        self._built_at = None
+        self._changes = 0
+        self._refreshing = False
+        self._executor = None
+        self._lock = threading.Lock()
+        self.dirty = True
+
+    def configure(self, suggest_config):
+        self.refresh_seconds = suggest_config.get('refresh_seconds', self.refresh_seconds)
+
+    @staticmethod
+    def normalize(text):
+        return ' '.join(text.casefold().split())
+
+    def rebuild(self):
+        with self._lock:
+            self.dirty = False
+            changes = self._changes
+        keywords = sorted(
+            (self.normalize(keyword), keyword)
+            for keyword in db.session.execute(select(SearchModel.keyword)).scalars()
+        )
+        titles = sorted(
+            (self.normalize(title), post_id, title)
+            for post_id, title in db.session.execute(select(Post.id, Post.title).where(Post.deleted == False))
+        )
+        with self._lock:
+            self._keywords = keywords
+            self._titles = titles
+            self._built_at = time.monotonic()
+            # 读取期间插入的新标题不在新数组中，需要再重建一次
+            if self._changes != changes:
+                self.dirty = True
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def add_titles(self, titles):
+        """新帖子提交后直接插入有序数组，无需整体重建"""
+        with self._lock:
+            self._changes += 1
+            for post_id, title in titles:
+                bisect.insort(self._titles, (self.normalize(title), post_id, title))
+
+    def refresh_in_background(self):
+        """在后台线程中重建，已有重建在进行时不重复提交"""
+        app = current_app._get_current_object()
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='search-suggest')
+        self._executor.submit(self._run_refresh, app)
+
+    def _run_refresh(self, app):
+        try:
+            with app.app_context():
+                self.rebuild()
+        except Exception:
+            self.mark_dirty()
+            logger.exception('搜索联想重建失败')
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    @staticmethod
+    def _prefix_range(entries, prefix, limit):
+        start = bisect.bisect_left(entries, (prefix,))
+        matches = []
+        for entry in entries[start:start + limit]:
+            if not entry[0].startswith(prefix):
+                break
+            matches.append(entry)
+        return matches
+
+    def suggest(self, prefix, limit=8):
+        prefix = self.normalize(prefix)
+        if not prefix:
+            return []
+        if self._built_at is None:
+            # 还没有可用的数组，只能同步构建
+            self.rebuild()
+        elif self.dirty or time.monotonic() - self._built_at >= self.refresh_seconds:
+            self.refresh_in_background()
+
+        keywords, titles = self._keywords, self._titles
+        suggestions = [
+            {'text': keyword, 'type': 'keyword'}
+            for _, keyword in self._prefix_range(keywords, prefix, limit)
+        ]
+        seen = {suggestion['text'] for suggestion in suggestions}
+        for _, post_id, title in self._prefix_range(titles, prefix, limit):
+            if len(suggestions) >= limit:
+                break
+            if title not in seen:
+                seen.add(title)
+                suggestions.append({'text': title, 'type': 'post', 'postId': post_id})
+        return suggestions
+
+
+search_suggester = PrefixSuggester()
+
+
+def _mark_source_changed(target):
+    session = inspect(target).session
+    if session is not None:
+        session.info['suggest_dirty'] = True
+
+
+@event.listens_for(Post, 'after_insert')
+def _post_inserted(mapper, connection, target):
+    session = inspect(target).session
+    if session is not None and not target.deleted:
+        session.info.setdefault('suggest_new_titles', []).append((target.id, target.title))
+
+
+@event.listens_for(Post, 'after_update')
+def _post_updated(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.title.history.has_changes() or state.attrs.deleted.history.has_changes():
+        _mark_source_changed(target)
+
+
+@event.listens_for(Post, 'after_delete')
+@event.listens_for(SearchModel, 'after_insert')
+@event.listens_for(SearchModel, 'after_update')
+@event.listens_for(SearchModel, 'after_delete')
+def _suggest_source_changed(mapper, connection, target):
+    _mark_source_changed(target)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_after_commit(session):
+    titles = session.info.pop('suggest_new_titles', None)
+    if session.info.pop('suggest_dirty', False):
+        search_suggester.mark_dirty()
+    elif titles and not search_suggester.dirty:
+        search_suggester.add_titles(titles)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('suggest_new_titles', None)
+    session.info.pop('suggest_dirty', None)
@@ -0,0 +1,79 @@
+"""
+搜索分词
+论坛内容以中文为主，默认分词器把连续的中日韩文字切成相邻二元组（bigram），
+拉丁字母和数字仍按单词切分。分词结果在写入索引时计算并保存，查询时只对关键词分词一次
+"""
+import re
+
+MAX_TERM_LENGTH = 64
+
+# 中日韩文字：平假名/片假名、CJK 扩展 A、CJK 统一汉字、兼容汉字、韩文音节
+_CJK_RANGES = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_cjk_or_word_pattern = re.compile(rf'(?P<cjk>[{_CJK_RANGES}]+)|(?P<word>[^\W{_CJK_RANGES}]+)')
+_word_pattern = re.compile(r'\w+')
+_cjk_char_pattern = re.compile(rf'[{_CJK_RANGES}]')
+
+
+class WordTokenizer:
+    """按 \\w+ 切分，连续的汉字会被当作一个词元"""
+    name = 'word'
+    version = 1
+
+    def tokenize(self, text):
+        if not text:
+            return []
+        return [token[:MAX_TERM_LENGTH] for token in _word_pattern.findall(text.casefold())]
+
+
+class CJKBigramTokenizer:
+    """中日韩文字按相邻二元组切分，单个汉字保留为一元组；其余文字按单词切分"""
+    name = 'cjk_bigram'
+    version = 1
+
+    def tokenize(self, text):
+        if not text:
+            return []
+
+        tokens = []
+        for match in _cjk_or_word_pattern.finditer(text.casefold()):
+            run = match.group('cjk')
+            if run is None:
+                tokens.append(match.group('word')[:MAX_TERM_LENGTH])
+            elif len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        return tokens
+
+
+TOKENIZERS = {
+    WordTokenizer.name: WordTokenizer,
+    CJKBigramTokenizer.name: CJKBigramTokenizer
+}
+
+_tokenizer = CJKBigramTokenizer()
+
+
+def set_tokenizer(name):
+    global _tokenizer
+    if name not in TOKENIZERS:
+        raise ValueError(f"Unknown search tokenizer: {name}")
+    _tokenizer = TOKENIZERS[name]()
+
+
+def get_tokenizer():
+    return _tokenizer
+
+
+def tokenize(text):
+    return _tokenizer.tokenize(text)
+
+
+def is_cjk_unigram(term):
+    """单个中日韩文字，查询时需要按前缀匹配索引中的二元组"""
+    return len(term) == 1 and _cjk_char_pattern.match(term) is not None
+
+
+def tokenizer_signature():
+    """分词器名称和版本，索引中保存的签名与之不一致时需要重建索引"""
+    return f'{_tokenizer.name}:{_tokenizer.version}'
@@ -0,0 +1,157 @@
+"""
+登录用户缓存
+before_request 每次都要按 session 中的 user_id 查询用户，这里按进程缓存用户的不可变快照（id、UID、用户名、角色），
+有容量上限（LRU）和有效期；g.user 是快照的代理，访问快照之外的属性（关注关系等）时才从数据库加载真实用户。
+角色或用户名修改、用户删除在提交后清除对应缓存，其他进程的缓存依靠有效期过期，
+涉及权限的管理操作用 force_db_user 从数据库重新读取当前用户
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import g, request
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from src.db_ext import db
+from src.functions.database.models import User
+
+UserSnapshot = namedtuple('UserSnapshot', ['id', 'user_uid', 'username', 'role'])
+
+# 修改后需要清除缓存的字段
+CACHED_FIELDS = ('user_uid', 'username', 'role')
+
+
+class CachedUser:
+    """User 的只读代理，快照中的字段直接返回，其他属性和写操作转给从数据库加载的 User"""
+    __slots__ = ('_snapshot', '_user')
+
+    def __init__(self, snapshot):
+        object.__setattr__(self, '_snapshot', snapshot)
+        object.__setattr__(self, '_user', None)
+
+    def _load(self):
+        user = self._user
+        if user is None:
+            user = db.session.get(User, self._snapshot.id)
+            if user is None:
+                raise AttributeError(f'user {self._snapshot.id} no longer exists')
+            object.__setattr__(self, '_user', user)
+        return user
+
+    def __getattr__(self, name):
+        if name in UserSnapshot._fields:
+            return getattr(self._snapshot, name)
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __repr__(self):
+        return f'<User {self._snapshot.id}>'
+
+
+class UserCache:
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, cfg):
+        self.max_size = cfg.get('max_size', self.max_size)
+        self.ttl = cfg.get('ttl', self.ttl)
+        self.clear()
+
+    def get(self, user_id):
+        """返回用户的代理，用户不存在时返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(user_id)
+                return CachedUser(entry[1])
+        row = db.session.execute(
+            select(User.id, User.user_uid, User.username, User.role).where(User.id == user_id)
+        ).first()
+        if row is None:
+            self.invalidate(user_id)
+            return None
+        snapshot = UserSnapshot(*row)
+        self._store(snapshot, now)
+        return CachedUser(snapshot)
+
+    def put(self, user):
+        self._store(UserSnapshot(user.id, user.user_uid, user.username, user.role), time.monotonic())
+
+    def _store(self, snapshot, now):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[snapshot.id] = (now + self.ttl, snapshot)
+            self._data.move_to_end(snapshot.id)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._data.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+user_cache = UserCache()
+
+
+def force_db_user(view):
+    """管理类视图使用：从数据库重新读取当前用户和角色，不使用缓存中的快照"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if g.get('user') is not None:
+            user = db.session.get(User, g.user.id)
+            if user is not None:
+                user_cache.put(user)
+            else:
+                user_cache.invalidate(g.user.id)
+            g.user = user
+            request.user = user
+            g.role = user.role if user else None
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _pending(target):
+    session = inspect(target).session
+    if session is None:
+        return None
+    return session.info.setdefault('user_cache_invalidate', set())
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in CACHED_FIELDS):
+        pending = _pending(target)
+        if pending is not None:
+            pending.add(target.id)
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending.add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop('user_cache_invalidate', ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('user_cache_invalidate', None)
@@ -1,7 +1,7 @@
 from flask import g, jsonify, request, abort, flash, url_for, redirect, render_template
 
 from src.functions.database.models import db, Like, Post, Comment, User, ReplyComment
-from src.functions.parser.markdown_parser import convert_markdown_to_html
+from src.functions.service.render_queue import render_queue
 
 
 def like_post_logic(post_id):
@@ -76,7 +76,7 @@ def edit_post_logic(post_id):
     if request.method == 'POST':
         post.title = request.form['title']
         post.content = request.form['content']
-        post.html_content = convert_markdown_to_html(post.content)
+        post.html_content, post.render_state = render_queue.render(post.content)
         db.session.commit()
         flash('帖子编辑成功！', 'success')
         return redirect(url_for('manage_posts'))
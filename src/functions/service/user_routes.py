@@ -95,6 +95,7 @@ def get_user_data(user_uid):
             'id': post.id,
             'title': post.title,
             'content': post.content,
+            'excerpt': post.excerpt or '',
             'time': post.created_at.strftime('%Y-%m-%d %H:%M:%S'),
             'like_count': post.like_count,
             'comment_count': Comment.query.filter_by(post_id=post.id, deleted=False).count(),
@@ -0,0 +1,138 @@
+"""
+键集（seek）分页
+按排序列的值定位下一页，不使用 OFFSET，翻到很深的页也只需沿索引读取一页数据；
+游标是不透明的 base64 字符串，记录当前页边界行的排序值和翻页方向
+"""
+import base64
+import binascii
+import json
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import tuple_, bindparam
+
+# 总数缓存的有效期（秒），总数只用于展示，不必每次请求都 COUNT(*)
+COUNT_CACHE_TTL = 60
+
+
+class KeysetPage:
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def _encode_value(value):
+    return {'t': value.isoformat()} if isinstance(value, datetime) else value
+
+
+def _decode_value(value):
+    return datetime.fromisoformat(value['t']) if isinstance(value, dict) else value
+
+
+def encode_cursor(sort, values, direction):
+    payload = json.dumps({'s': sort, 'v': [_encode_value(value) for value in values], 'd': direction})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(sort, cursor, size):
+    """解析游标得到 (排序值, 方向)，游标无效或不属于当前排序方式时抛出 ValueError"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        values = [_decode_value(value) for value in payload['v']]
+        direction = payload['d']
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        raise ValueError('invalid cursor')
+    if payload.get('s') != sort or len(values) != size or direction not in ('next', 'prev'):
+        raise ValueError('invalid cursor')
+    return values, direction
+
+
+def keyset_paginate(query, sort, columns, cursor=None, per_page=10):
+    """
+    按 columns 全部降序分页，columns 的最后一列必须唯一（通常是主键）
+    cursor 无效时返回第一页
+    """
+    values, direction = None, 'next'
+    if cursor:
+        try:
+            values, direction = decode_cursor(sort, cursor, len(columns))
+        except ValueError:
+            values, direction = None, 'next'
+
+    key = tuple_(*columns)
+    if values is not None:
+        boundary = tuple_(*(bindparam(None, value, type_=column.type) for column, value in zip(columns, values)))
+    if direction == 'next':
+        if values is not None:
+            query = query.filter(key < boundary)
+        query = query.order_by(*(column.desc() for column in columns))
+    else:
+        query = query.filter(key > boundary).order_by(*(column.asc() for column in columns))
+
+    # 多取一行判断翻页方向上是否还有数据
+    items = query.limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    if direction == 'prev':
+        items.reverse()
+
+    def row_values(item):
+        return [getattr(item, column.key) for column in columns]
+
+    next_cursor = prev_cursor = None
+    if items:
+        if direction == 'prev' or has_more:
+            next_cursor = encode_cursor(sort, row_values(items[-1]), 'next')
+        if (direction == 'next' and values is not None) or (direction == 'prev' and has_more):
+            prev_cursor = encode_cursor(sort, row_values(items[0]), 'prev')
+    return KeysetPage(items, per_page, next_cursor, prev_cursor)
+
+
+class CountCache:
+    """按键缓存 COUNT(*) 结果，过期后下一次请求重新计算"""
+
+    def __init__(self, ttl=COUNT_CACHE_TTL):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        value = compute()
+        with self._lock:
+            self._data[key] = (now + self.ttl, value)
+        return value
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+count_cache = CountCache()
@@ -0,0 +1,85 @@
+"""
+Markdown 渲染每次调用的固定开销基准测试（不由 pytest 收集）
+对比旧写法（每次调用重建字典、逐个告示类型编译正则、新建 Markdown/CSSSanitizer/Cleaner，
+清理后再用 BeautifulSoup 重新解析、序列化一次）与模块级 MarkdownRenderer 的完整渲染
+旧写法的 BeautifulSoup 阶段需要另外安装 beautifulsoup4，未安装时跳过该阶段
+
+运行：PYTHONPATH=. python test/bench_markdown_parser.py
+"""
+import re
+import timeit
+
+import bleach
+from bleach.css_sanitizer import CSSSanitizer
+from markdown import markdown
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+from src.functions.parser.markdown_parser import BANNER_TYPES, CSS_SANITIZER, ALLOWED_TAGS, ALLOWED_ATTRIBUTES, \
+    MARKDOWN_EXTENSIONS, renderer
+
+SHORT_DOCUMENT = '好文，**支持**一下'
+LONG_DOCUMENT = '\n\n'.join([
+    '# 标题',
+    ':::tip 这是一条提示 :::',
+    ':::warning 这是一条警告 :::',
+    '- 列表\n  - 嵌套列表\n  - 嵌套列表',
+    '| 列 1 | 列 2 |\n|------|------|\n| 值 1 | 值 2 |',
+    '```python\nfor i in range(10):\n    print(i)\n```',
+    '正文段落，包含 `行内代码` 和 [链接](https://example.com)。' * 20
+] * 5)
+
+
+def legacy_render(markdown_text):
+    """重构前 convert_markdown_to_html 的预处理、转换和清理阶段"""
+    banner_patterns = {banner_type: rf':::{banner_type}\s+([^\n]+?)\s*:::' for banner_type in BANNER_TYPES}
+    banner_icons = {banner_type: icon for banner_type, (icon, _) in BANNER_TYPES.items()}
+    banner_titles = {banner_type: title for banner_type, (_, title) in BANNER_TYPES.items()}
+    for banner_type in banner_patterns.keys():
+        pattern = re.compile(rf':::{banner_type}\s+([^\n]+?)\s*:::', flags=re.DOTALL)
+        markdown_text = pattern.sub(
+            lambda m: f'<div class="banner banner-{banner_type}">'
+                      '<div class="banner-header">'
+                      f'<i class="fa {banner_icons.get(banner_type, "fa-exclamation-circle")}"></i> '
+                      f'<h4>{banner_titles[banner_type]}</h4>'
+                      '</div>'
+                      f'<div class="banner-content">{m.group(1)}</div></div>',
+            markdown_text
+        )
+    markdown_text = re.sub(r'(\n\s{2})(\*|\+|-)\s', r'\1    \2 ', markdown_text)
+    html = markdown(markdown_text, extensions=MARKDOWN_EXTENSIONS)
+    css_sanitizer = CSSSanitizer(allowed_css_properties=list(CSS_SANITIZER.allowed_css_properties))
+    sanitized_html = bleach.clean(html, tags=list(ALLOWED_TAGS), attributes=dict(ALLOWED_ATTRIBUTES),
+                                  css_sanitizer=css_sanitizer, strip=True)
+    if BeautifulSoup is None:
+        return sanitized_html
+    soup = BeautifulSoup(sanitized_html, 'html.parser')
+    for code_block in soup.find_all('code'):
+        parent_pre = code_block.find_parent('pre')
+        if parent_pre:
+            parent_pre['class'] = parent_pre.get('class', []) + ['line-numbers']
+    for img in soup.find_all('img'):
+        img['class'] = img.get('class', []) + ['fancybox']
+    return str(soup)
+
+
+def current_render(markdown_text):
+    return renderer.render(markdown_text)
+
+
+def bench(name, func, document, number):
+    seconds = min(timeit.repeat(lambda: func(document), number=number, repeat=5))
+    per_call = seconds / number * 1e6
+    print(f'{name:<28}{per_call:>10.1f} µs/次')
+    return per_call
+
+
+if __name__ == '__main__':
+    for label, document, number in (('短文本', SHORT_DOCUMENT, 500), ('长文本', LONG_DOCUMENT, 20)):
+        print(f'[{label}，{len(document)} 字符]')
+        before = bench('重构前（每次重建）', legacy_render, document, number)
+        after = bench('MarkdownRenderer', current_render, document, number)
+        print(f'{"加速比":<28}{before / after:>10.2f}x')
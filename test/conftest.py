@@ -0,0 +1,37 @@
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from src.db_ext import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    """独立的内存数据库应用，instance 目录位于临时目录；需要初始数据的测试文件覆盖此夹具"""
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def count_statements():
+    """执行 func，返回 (执行的 SQL 数量, 返回值)"""
+    def count(func):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            result = func()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        return len(statements), result
+
+    return count
@@ -1,5 +1,6 @@
 import pytest
-from app import app, db, User, Post
+from app import app, db
+from src.functions.database.models import User, Post
 import json
 
 @pytest.fixture
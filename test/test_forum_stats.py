@@ -0,0 +1,61 @@
+import pytest
+
+from src.db_ext import db
+from src.functions.database.models import User, Post, Comment, Section
+from src.functions.service.forum_stats import forum_stats
+
+
+@pytest.fixture
+def app(app):
+    db.session.add_all([User(username='alice', password='x', user_uid=1), Section(name='综合')])
+    db.session.commit()
+    db.session.add(Post(title='你好', content='正文', html_content='<p>正文</p>', author_id=1, section_id=1))
+    db.session.commit()
+    forum_stats.invalidate()
+    yield app
+    forum_stats.invalidate()
+
+
+def test_stats_loaded_once_then_served_from_memory(app, count_statements):
+    loaded, stats = count_statements(forum_stats.get)
+    assert loaded > 0
+    assert stats == {'topics': 1, 'messages': 0, 'users': 1, 'latest_user': 'alice'}
+    assert count_statements(forum_stats.get) == (0, stats)
+
+
+def test_stats_follow_committed_changes(app, count_statements):
+    forum_stats.get()
+    db.session.add(User(username='bob', password='x', user_uid=2))
+    db.session.add(Comment(content='回复', html_content='<p>回复</p>', author_id=1, post_id=1))
+    db.session.add(Post(title='第二篇', content='正文', html_content='<p>正文</p>', author_id=1, section_id=1))
+    db.session.commit()
+    assert count_statements(forum_stats.get) == (0, {'topics': 2, 'messages': 1, 'users': 2, 'latest_user': 'bob'})
+
+    # 软删除和恢复
+    post = db.session.get(Post, 1)
+    post.deleted = True
+    db.session.commit()
+    assert forum_stats.get()['topics'] == 1
+    post.deleted = False
+    post.look_count = (post.look_count or 0) + 1
+    db.session.commit()
+    assert forum_stats.get()['topics'] == 2
+
+
+def test_rolled_back_changes_are_discarded(app):
+    forum_stats.get()
+    db.session.add(Post(title='草稿', content='正文', html_content='<p>正文</p>', author_id=1, section_id=1))
+    db.session.flush()
+    db.session.rollback()
+    assert forum_stats.get()['topics'] == 1
+
+
+def test_hard_delete_recounts(app):
+    forum_stats.get()
+    db.session.add(Comment(content='回复', html_content='<p>回复</p>', author_id=1, post_id=1))
+    db.session.commit()
+    db.session.delete(db.session.get(Post, 1))
+    db.session.commit()
+    stats = forum_stats.get()
+    assert stats['topics'] == 0
+    assert stats['messages'] == db.session.query(Comment).filter_by(deleted=False).count()
@@ -0,0 +1,62 @@
+from datetime import datetime, date
+
+import pytest
+from sqlalchemy import select, func, tuple_, create_engine, text
+
+from src.db_ext import db
+from src.functions.database.migrations import create_missing_indexes
+from src.functions.database.models import Post, Comment, Like, ReplyComment, Report, UserContribution, SearchDocument
+from src.functions.index import post_listing_query, SORT_COLUMNS
+
+
+def explain(statement):
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    return ' | '.join(row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {compiled}')))
+
+
+def listing(sort, **filters):
+    return post_listing_query(**filters).order_by(*(column.desc() for column in SORT_COLUMNS[sort])).limit(11).statement
+
+
+@pytest.mark.parametrize('statement, index', [
+    # 首页和板块列表（首页、翻页、总数）
+    (lambda: listing('timeline'), 'ix_post_live_created'),
+    (lambda: listing('global'), 'ix_post_live_likes'),
+    (lambda: listing('timeline', section_id=1), 'ix_post_section_live_created'),
+    (lambda: listing('global', section_id=1), 'ix_post_section_live_likes'),
+    (lambda: post_listing_query().filter(tuple_(Post.created_at, Post.id) < tuple_(datetime(2024, 1, 1), 5))
+     .order_by(Post.created_at.desc(), Post.id.desc()).limit(11).statement, 'ix_post_live_created'),
+    (lambda: select(func.count()).select_from(Post).filter_by(deleted=False, section_id=1), 'ix_post_section_live_'),
+    # 个人主页、帖子详情、点赞和举报
+    (lambda: select(Post).filter_by(author_id=1, deleted=False).order_by(Post.created_at.desc()),
+     'ix_post_author_created'),
+    (lambda: select(Comment).filter_by(post_id=1, deleted=False), 'ix_comment_post_deleted'),
+    (lambda: select(func.count()).select_from(Comment).filter_by(author_id=1), 'ix_comment_author'),
+    (lambda: select(Like).filter_by(user_id=1, post_id=2), 'ix_like_user_post'),
+    (lambda: select(Like).filter_by(user_id=1, comment_id=2), 'ix_like_user_comment'),
+    (lambda: select(ReplyComment).filter_by(target_comment_id=2), 'ix_reply_comment_target'),
+    (lambda: select(Report).filter_by(status='pending').order_by(Report.created_at.desc()), 'ix_report_status_created'),
+    # 批量删除板块时按帖子清理依赖数据
+    (lambda: select(Like.id).where(Like.post_id.in_([1, 2])), 'ix_like_post'),
+    (lambda: select(Report.id).where(Report.comment_id.in_([1, 2])), 'ix_report_comment'),
+    (lambda: select(SearchDocument.id).where(SearchDocument.post_id.in_([1, 2])), 'ix_search_document_post'),
+    (lambda: select(UserContribution).filter_by(user_uid=1).filter(UserContribution.date >= date(2024, 1, 1)),
+     'sqlite_autoindex_user_contribution_1'),
+])
+def test_hot_queries_use_indexes(app, statement, index):
+    plan = explain(statement())
+    assert f'USING INDEX {index}' in plan or f'USING COVERING INDEX {index}' in plan, plan
+
+
+def test_create_missing_indexes_for_existing_database(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "old.db"}')
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text('DROP INDEX ix_post_live_created'))
+        connection.execute(text('DROP INDEX ix_like_user_post'))
+
+    assert sorted(create_missing_indexes(engine, db.metadata)) == ['ix_like_user_post', 'ix_post_live_created']
+    assert create_missing_indexes(engine, db.metadata) == []
+    with engine.connect() as connection:
+        sql = connection.execute(text("SELECT sql FROM sqlite_master WHERE name = 'ix_post_live_created'")).scalar()
+    assert 'WHERE deleted = 0' in sql
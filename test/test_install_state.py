@@ -0,0 +1,61 @@
+import os
+
+from src.db_ext import db
+from src.functions.database.models import User, InstallationStatus
+from src.functions.service.install_state import InstallState
+
+
+def test_not_installed_checks_only_marker(app, count_statements):
+    state = InstallState()
+    state.init_app(app)
+    assert state.load() is False
+    assert count_statements(lambda: state.installed) == (0, False)
+
+    # 另一个工作进程完成安装
+    other = InstallState()
+    other.init_app(app)
+    other.mark_installed()
+    assert count_statements(lambda: state.installed) == (0, True)
+
+
+def test_installed_database_writes_marker(app, count_statements):
+    db.session.add_all([User(username='admin', password='x', role='admin', user_uid=1),
+                        InstallationStatus(is_installed=True)])
+    db.session.commit()
+    state = InstallState()
+    state.init_app(app)
+    assert state.installed is True
+    assert count_statements(lambda: state.installed) == (0, True)
+
+    restarted = InstallState()
+    restarted.init_app(app)
+    assert restarted.load() is True
+    assert count_statements(lambda: restarted.installed) == (0, True)
+
+
+def test_stale_marker_removed_when_database_reset(app):
+    state = InstallState()
+    state.init_app(app)
+    state.mark_installed()
+
+    # forum.db 被删除重建，标记文件还在
+    restarted = InstallState()
+    restarted.init_app(app)
+    assert restarted.load() is False
+    assert not os.path.exists(restarted.marker_path)
+    assert restarted.installed is False
+
+
+def test_missing_status_table_falls_back_to_users(app):
+    db.session.add(User(username='admin', password='x', role='admin', user_uid=1))
+    db.session.commit()
+    InstallationStatus.__table__.drop(db.engine)
+
+    state = InstallState()
+    state.init_app(app)
+    state.mark_installed()
+    restarted = InstallState()
+    restarted.init_app(app)
+    assert restarted.load() is True
+    assert os.path.exists(restarted.marker_path)
+    assert restarted.installed is True
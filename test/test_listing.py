@@ -0,0 +1,141 @@
+import pytest
+from sqlalchemy import inspect
+
+from src.db_ext import db
+from src.functions.database.models import User, Post, Section
+from src.functions import index
+from src.functions.index import post_listing_query, paginate_posts
+from src.functions.utils.pagination import keyset_paginate, encode_cursor, count_cache
+
+
+@pytest.fixture
+def app(app):
+    """两位作者在两个板块各发 15 篇帖子"""
+    db.session.add_all([
+        User(username='alice', password='x', user_uid=1),
+        User(username='bob', password='x', user_uid=2),
+        Section(name='综合'),
+        Section(name='技术')
+    ])
+    db.session.commit()
+    for i in range(30):
+        db.session.add(Post(title=f'帖子 {i}', content='**正文** ' * 100, html_content='<p>正文</p>' * 100,
+                            author_id=i % 2 + 1, section_id=i % 2 + 1, like_count=i % 7))
+    db.session.commit()
+    db.session.expunge_all()
+    count_cache.clear()
+    return app
+
+
+@pytest.fixture
+def count_listing_statements(app, monkeypatch, count_statements):
+    """统计列表页第一页（总数未缓存时）执行的 SQL 数量"""
+    def count(per_page, **filters):
+        monkeypatch.setattr(index, 'PER_PAGE', per_page)
+        count_cache.clear()
+
+        def load():
+            with app.test_request_context():
+                posts = paginate_posts('timeline', **filters)
+            # 模板中卡片用到的属性
+            cards = [(post.id, post.title, post.excerpt, post.author.username, post.section.name,
+                      post.like_count, post.look_count, post.created_at) for post in posts.items]
+            return cards, posts.items
+
+        statements, (cards, items) = count_statements(load)
+        db.session.expunge_all()
+        return statements, cards, items
+
+    return count
+
+
+def test_listing_statement_count_independent_of_page_size(count_listing_statements):
+    small, cards, _ = count_listing_statements(5)
+    large, _, _ = count_listing_statements(25)
+    assert len(cards) == 5
+    assert small == large == 2  # 总数 + 当前页
+    assert count_listing_statements(25, section_id=1)[0] == 2
+
+
+def test_listing_does_not_load_post_bodies(count_listing_statements):
+    _, cards, items = count_listing_statements(10)
+    assert cards[0][2].startswith('正文 正文') and cards[0][2].endswith('...')
+    for post in items:
+        assert {'content', 'html_content'} <= inspect(post).unloaded
+
+
+@pytest.mark.parametrize('sort, columns', [
+    ('timeline', (Post.created_at, Post.id)),
+    ('global', (Post.like_count, Post.created_at, Post.id))
+])
+def test_keyset_pages_match_offset_order(app, sort, columns):
+    expected = [post.id for post in Post.query.order_by(*(column.desc() for column in columns))]
+
+    # 向后翻到底
+    pages, cursor = [], None
+    while True:
+        page = keyset_paginate(post_listing_query(), sort, columns, cursor=cursor, per_page=7)
+        pages.append([post.id for post in page])
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+    assert [post_id for ids in pages for post_id in ids] == expected
+    assert [len(ids) for ids in pages] == [7, 7, 7, 7, 2]
+
+    # 再用上一页游标翻回第一页
+    for ids in reversed(pages[:-1]):
+        page = keyset_paginate(post_listing_query(), sort, columns, cursor=page.prev_cursor, per_page=7)
+        assert [post.id for post in page] == ids
+    assert not page.has_prev
+
+
+def test_keyset_invalid_or_foreign_cursor_returns_first_page(app):
+    first = keyset_paginate(post_listing_query(), 'timeline', (Post.created_at, Post.id), per_page=5)
+    for cursor in ('not-a-cursor', encode_cursor('global', [1, 2, 3], 'next')):
+        page = keyset_paginate(post_listing_query(), 'timeline', (Post.created_at, Post.id), cursor=cursor, per_page=5)
+        assert [post.id for post in page] == [post.id for post in first]
+        assert not page.has_prev and page.has_next
+
+
+def test_listing_total_refreshed_after_post_changes(app):
+    def totals():
+        with app.test_request_context():
+            return paginate_posts('timeline').total, paginate_posts('timeline', section_id=1).total, \
+                paginate_posts('timeline', section_id=2).total
+
+    assert totals() == (30, 15, 15)
+
+    post = Post(title='新帖子', content='正文', html_content='', author_id=1, section_id=1)
+    db.session.add(post)
+    db.session.commit()
+    assert totals() == (31, 16, 15)
+
+    post.deleted = True
+    db.session.commit()
+    assert totals() == (30, 15, 15)
+
+    post.deleted = False
+    post.section_id = 2
+    db.session.commit()
+    assert totals() == (31, 15, 16)
+
+    # 原板块未加载时清除全部总数
+    db.session.expire(post, ['section_id'])
+    post.section_id = 1
+    db.session.commit()
+    assert totals() == (31, 16, 15)
+
+    db.session.delete(post)
+    db.session.commit()
+    assert totals() == (30, 15, 15)
+
+
+def test_listing_total_kept_after_rollback(app):
+    with app.test_request_context():
+        assert paginate_posts('timeline').total == 30
+    db.session.add(Post(title='未提交', content='正文', html_content='', author_id=1, section_id=1))
+    db.session.flush()
+    db.session.rollback()
+    assert 'post_listing' not in db.session.info
+    with app.test_request_context():
+        assert paginate_posts('timeline').total == 30
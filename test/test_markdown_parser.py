@@ -0,0 +1,265 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+from sqlalchemy import create_engine, text, update
+
+from src.db_ext import db
+from src.functions.database.migrations import upgrade_schema
+from src.functions.database.models import User, Post, Comment, Section
+from src.functions.parser import markdown_parser
+from src.functions.parser.markdown_parser import RenderCache, convert_markdown_to_html, render_markdown, make_excerpt
+from src.functions.service import markdown_maintenance
+from src.functions.service.markdown_maintenance import strip_stored_assets, rerender_stored_html, backfill_excerpts
+from src.functions.service.render_queue import RenderQueue, RENDER_DONE, RENDER_PENDING
+
+
+def test_render_cache_reuses_html(monkeypatch):
+    """相同内容只渲染一次，结果与直接渲染一致"""
+    cache = RenderCache()
+    monkeypatch.setattr(markdown_parser, 'render_cache', cache)
+
+    html = convert_markdown_to_html('# 标题\n\n正文')
+    assert html == render_markdown('# 标题\n\n正文')
+    assert convert_markdown_to_html('# 标题\n\n正文') == html
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_render_cache_evicts_by_size():
+    cache = RenderCache(max_bytes=10)
+    cache.set('a', '12345')
+    cache.set('b', '12345')
+    cache.set('c', '12345')
+    assert cache.get('a') is None
+    assert cache.get('c') == '12345'
+
+
+def test_render_cache_counts_utf8_bytes():
+    # 三个中文字符编码后占 9 个字节，超过上限，不缓存
+    cache = RenderCache(max_bytes=8)
+    cache.set('a', '一二三')
+    assert cache.get('a') is None
+
+
+def test_render_cache_disk_purges_old_versions(tmp_path, monkeypatch):
+    """磁盘缓存按解析器版本分目录，版本递增后旧目录被清理"""
+    cache = RenderCache(directory=str(tmp_path))
+    key = cache.key('**粗体**')
+    cache.set(key, '<p><strong>粗体</strong></p>')
+
+    # 新进程（内存为空）仍可从磁盘读取
+    assert RenderCache(directory=str(tmp_path)).get(key) == '<p><strong>粗体</strong></p>'
+
+    monkeypatch.setattr(markdown_parser, 'PARSER_VERSION', markdown_parser.PARSER_VERSION + 1)
+    upgraded = RenderCache(directory=str(tmp_path))
+    assert upgraded.key('**粗体**') != key
+    assert [path.name for path in tmp_path.iterdir()] == [f'v{markdown_parser.PARSER_VERSION}']
+
+
+def test_render_cache_disk_evicts_least_recently_used(tmp_path):
+    """磁盘缓存超过上限时删除最久未访问的文件"""
+    cache = RenderCache(directory=str(tmp_path), max_disk_bytes=100)
+    for i, key in enumerate(['a0', 'b0', 'c0']):
+        cache.set(key, 'x' * 40)
+        os.utime(cache._path(key), (i, i))
+    assert not os.path.exists(cache._path('a0'))
+
+    # 读取过的文件比未读取的更晚被淘汰
+    cache.clear()
+    assert cache.get('b0') == 'x' * 40
+    cache.set('d0', 'x' * 40)
+    assert os.path.exists(cache._path('b0')) and os.path.exists(cache._path('d0'))
+    assert not os.path.exists(cache._path('c0'))
+
+
+def test_render_emits_content_only():
+    """渲染结果只包含正文，PrismJS、FancyBox 和样式由页面模板加载"""
+    html = render_markdown(':::tip 小心 :::\n\n```python\nprint(1)\n```\n\n![图](a.png)')
+    assert '<head>' not in html and '<style>' not in html and '<link' not in html
+    assert 'banner banner-tip' in html
+    assert '<pre class="line-numbers"><code class="language-python">' in html
+    assert 'data-fancybox="gallery"' in html
+
+
+def test_strip_stored_assets(app):
+    db.session.add_all([User(username='alice', password='x', user_uid=1), Section(name='综合')])
+    db.session.commit()
+
+    legacy = '<head><link rel="stylesheet" href="prism.css"/><style>.banner {}</style></head><p>旧内容</p>'
+    post = Post(title='旧帖', content='旧内容', html_content=legacy, author_id=1, section_id=1)
+    fresh = Post(title='新帖', content='新内容', html_content='<p>新内容</p>', author_id=1, section_id=1)
+    db.session.add_all([post, fresh])
+    db.session.commit()
+    db.session.add(Comment(content='旧评论', html_content=legacy, author_id=1, post_id=post.id))
+    db.session.commit()
+
+    assert strip_stored_assets(batch_size=1, log=lambda message: None) == {'post': 1, 'comment': 1}
+    db.session.expire_all()
+    assert db.session.get(Post, post.id).html_content == '<p>旧内容</p>'
+    assert db.session.get(Post, fresh.id).html_content == '<p>新内容</p>'
+    assert Comment.query.one().html_content == '<p>旧内容</p>'
+
+
+def test_banners_rendered_in_single_pass():
+    html = render_markdown(':::tip 提示内容 ::: 和 :::danger 危险内容 :::\n\n:::unknown 未知 :::')
+    assert '<div class="banner banner-tip">' in html and '<h4>提示</h4>' in html
+    assert '<div class="banner banner-danger">' in html and '危险内容</div>' in html
+    assert ':::unknown 未知 :::' in html
+
+
+def test_renderer_threads_render_consistently():
+    """每个线程使用自己的 Markdown 和 Cleaner 实例，并发渲染结果一致"""
+    documents = [f'# 标题 {i}\n\n- 列表\n  - 嵌套 {i}\n\n```python\nprint({i})\n```' for i in range(20)]
+    expected = [render_markdown(document) for document in documents]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(render_markdown, documents * 3)) == expected * 3
+
+
+def test_filters_apply_embed_whitelist_and_code_classes():
+    html = render_markdown(
+        '```\nplain\n```\n\n'
+        '<iframe src="https://www.youtube.com/embed/abc" width="100"></iframe>'
+        '<iframe src="https://evil.example.com/">fallback</iframe>\n\n'
+        '<blockquote class="tiktok-embed" cite="https://www.tiktok.com/@a/video/1"><section>视频</section></blockquote>'
+    )
+    assert '<pre class="line-numbers"><code class="language-text">plain' in html
+    assert 'width="100" height="315"' in html and 'referrerpolicy="strict-origin-when-cross-origin"' in html
+    assert 'evil.example.com' not in html and 'fallback' not in html
+    assert html.count('<script src="https://www.tiktok.com/embed.js" async></script></blockquote>') == 1
+
+
+def test_rerender_stored_html_resumes_from_checkpoint(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "forum.db"}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(username='alice', password='x', user_uid=1), Section(name='综合')])
+        db.session.commit()
+        posts = [Post(title=f'帖子 {i}', content=f'**内容 {i}**', html_content='过期', author_id=1, section_id=1)
+                 for i in range(5)]
+        db.session.add_all(posts)
+        db.session.commit()
+        db.session.add(Comment(content='`评论`', html_content='过期', author_id=1, post_id=posts[0].id))
+        db.session.commit()
+
+        # 模拟上次运行在第二个帖子之后中断
+        checkpoint = tmp_path / 'checkpoint.json'
+        markdown_maintenance._save_checkpoint(str(checkpoint), {'post': posts[1].id})
+
+        summary = rerender_stored_html(batch_size=2, workers=2, checkpoint_path=str(checkpoint),
+                                       log=lambda message: None)
+        assert summary == {'post': (3, 3), 'comment': (1, 1)}
+        assert not checkpoint.exists()
+
+        db.session.expire_all()
+        assert [db.session.get(Post, post.id).html_content for post in posts[:2]] == ['过期', '过期']
+        assert db.session.get(Post, posts[4].id).html_content == '<p><strong>内容 4</strong></p>'
+        assert Comment.query.one().html_content == '<p><code>评论</code></p>'
+
+        db.session.remove()
+        db.drop_all()
+
+
+def test_rerender_stored_html_keeps_rows_edited_during_run(tmp_path, monkeypatch):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "forum.db"}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(username='alice', password='x', user_uid=1), Section(name='综合')])
+        db.session.commit()
+        posts = [Post(title=f'帖子 {i}', content=f'**内容 {i}**', html_content='过期', author_id=1, section_id=1)
+                 for i in range(2)]
+        db.session.add_all(posts)
+        db.session.commit()
+
+        iter_chunks = markdown_maintenance._iter_chunks
+
+        def edit_after_read(table, last_id, batch_size):
+            for chunk in iter_chunks(table, last_id, batch_size):
+                yield chunk
+                # 已读取、尚未写回时第一个帖子被编辑
+                if table.name == 'post':
+                    db.session.execute(update(table).where(table.c.id == posts[0].id)
+                                       .values(content='**新内容**', html_content='<p><strong>新内容</strong></p>'))
+                    db.session.commit()
+
+        monkeypatch.setattr(markdown_maintenance, '_iter_chunks', edit_after_read)
+        summary = rerender_stored_html(batch_size=2, workers=1, checkpoint_path=str(tmp_path / 'checkpoint.json'),
+                                       log=lambda message: None)
+        assert summary['post'] == (2, 1)
+
+        db.session.expire_all()
+        assert db.session.get(Post, posts[0].id).html_content == '<p><strong>新内容</strong></p>'
+        assert db.session.get(Post, posts[1].id).html_content == '<p><strong>内容 1</strong></p>'
+
+        db.session.remove()
+        db.drop_all()
+
+
+def test_render_queue_renders_long_posts_in_background(app):
+    queue = RenderQueue()
+    queue.init_app(app, {'enabled': True, 'threshold': 20})
+    db.session.add_all([User(username='alice', password='x', user_uid=1), Section(name='综合')])
+    db.session.commit()
+
+    html_content, render_state = queue.render('**短**')
+    assert render_state == RENDER_DONE and html_content == '<p><strong>短</strong></p>'
+
+    content = '**长帖子** <script>alert(1)</script>\n\n' + '正文' * 20
+    html_content, render_state = queue.render(content)
+    assert render_state == RENDER_PENDING
+    assert html_content.startswith('<p>**长帖子** &lt;script&gt;') and '<br>' not in html_content
+
+    post = Post(title='长帖', content=content, html_content=html_content, render_state=render_state,
+                author_id=1, section_id=1)
+    db.session.add(post)
+    db.session.commit()
+
+    # 后台任务完成后 html_content 被替换为完整渲染结果
+    assert queue.enqueue_pending() == 1
+    queue._executor.shutdown(wait=True)
+    db.session.expire_all()
+    post = db.session.get(Post, post.id)
+    assert post.render_state == RENDER_DONE
+    assert post.html_content.startswith('<p><strong>长帖子</strong>')
+
+
+def test_upgrade_schema_adds_missing_columns(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "old.db"}')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE post (id INTEGER PRIMARY KEY, content TEXT)'))
+        connection.execute(text("INSERT INTO post (content) VALUES ('旧帖')"))
+
+    assert upgrade_schema(engine) == ['post.render_state', 'post.excerpt']
+    assert upgrade_schema(engine) == []
+    with engine.connect() as connection:
+        assert connection.execute(text('SELECT render_state FROM post')).scalar() == RENDER_DONE
+
+
+def test_excerpt_stripped_before_truncation():
+    content = '# 标题\n\n**粗体**和[链接](https://example.com)![图](a.png)\n\n- 列表项\n\n```python\nprint(1)\n```'
+    assert make_excerpt(content) == '标题 粗体和链接 列表项 print(1)'
+    # 截断落在强调语法中间时不会留下未闭合的 **
+    assert make_excerpt('**' + '字' * 200 + '**') == '字' * 150 + '...'
+
+
+def test_post_excerpt_follows_content_and_backfills(app):
+    db.session.add_all([User(username='alice', password='x', user_uid=1), Section(name='综合')])
+    db.session.commit()
+
+    post = Post(title='帖子', content='**第一版**', html_content='', author_id=1, section_id=1)
+    db.session.add(post)
+    db.session.commit()
+    assert post.excerpt == '第一版'
+    post.content = '`第二版`'
+    db.session.commit()
+    assert post.excerpt == '第二版'
+
+    # 摘要列加入之前的旧数据
+    db.session.execute(Post.__table__.update().values(excerpt=None))
+    db.session.commit()
+    assert backfill_excerpts(batch_size=1, log=lambda message: None) == 1
+    db.session.expire_all()
+    assert db.session.get(Post, post.id).excerpt == '第二版'
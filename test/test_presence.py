@@ -0,0 +1,56 @@
+from collections import namedtuple
+
+import pytest
+
+from src.functions.service import presence
+from src.functions.service.presence import PresenceTracker, MemoryPresenceBackend, SQLitePresenceBackend
+
+FakeUser = namedtuple('FakeUser', ['user_uid', 'username'])
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [600000.0]
+    monkeypatch.setattr(presence.time, 'time', lambda: now[0])
+    return now
+
+
+def test_memory_window_expires_old_buckets(clock):
+    tracker = PresenceTracker(MemoryPresenceBackend(window_minutes=5), cache_seconds=0)
+    tracker.touch(FakeUser(1, 'alice'), '10.0.0.1', 'firefox')
+    tracker.touch(None, '10.0.0.2', 'chrome')
+    tracker.touch(None, '10.0.0.2', 'chrome')
+    clock[0] += 120
+    tracker.touch(FakeUser(1, 'alice'), '10.0.0.1', 'firefox')
+    tracker.touch(None, '10.0.0.3', 'chrome')
+    assert tracker.snapshot() == {'total': 3, 'users': 1, 'guests': 2,
+                                  'users_list': [{'user_uid': 1, 'username': 'alice'}]}
+
+    # 之前的访问者都离开窗口，槽位被复用后旧数据不再计入
+    clock[0] += 5 * 60
+    tracker.touch(FakeUser(2, 'bob'), '10.0.0.4', 'safari')
+    snapshot = tracker.snapshot()
+    assert (snapshot['users'], snapshot['guests']) == (1, 0)
+    assert snapshot['users_list'] == [{'user_uid': 2, 'username': 'bob'}]
+
+
+def test_totals_cached_between_renders(clock):
+    tracker = PresenceTracker(MemoryPresenceBackend(), cache_seconds=60)
+    tracker.touch(None, '10.0.0.1', 'firefox')
+    assert tracker.snapshot()['total'] == 1
+    tracker.touch(None, '10.0.0.2', 'firefox')
+    assert tracker.snapshot()['total'] == 1
+
+
+def test_sqlite_backend_shared_between_workers(clock, tmp_path):
+    path = str(tmp_path / 'presence.db')
+    first = PresenceTracker(SQLitePresenceBackend(path), cache_seconds=0)
+    second = PresenceTracker(SQLitePresenceBackend(path), cache_seconds=0)
+    first.touch(FakeUser(1, 'alice'), '10.0.0.1', 'firefox')
+    second.touch(None, '10.0.0.2', 'chrome')
+    second.touch(FakeUser(1, 'alice'), '10.0.0.1', 'firefox')
+    assert first.snapshot() == second.snapshot() == {
+        'total': 2, 'users': 1, 'guests': 1, 'users_list': [{'user_uid': 1, 'username': 'alice'}]}
+
+    clock[0] += 6 * 60
+    assert first.snapshot()['total'] == 0
@@ -0,0 +1,223 @@
+import json
+
+import pytest
+
+from src.db_ext import db
+from src.functions.database.models import User, Post, Comment, Section, SearchDocument, SearchModel
+from src.functions.service.search_cache import search_cache, MemoryCacheBackend, SQLiteCacheBackend
+from src.functions.service.search_suggest import PrefixSuggester, search_suggester
+from src.functions.service.search_index import query_index, rebuild_search_index
+from src.functions.service.search_logic import search_logic, similarity_matches, iter_search_ndjson, \
+    decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def app(app):
+    db.session.add_all([User(username='alice', password='x', user_uid=1), Section(name='综合')])
+    db.session.commit()
+    return app
+
+
+def create_post(title, content):
+    post = Post(title=title, content=content, html_content='', author_id=1, section_id=1)
+    db.session.add(post)
+    db.session.commit()
+    return post
+
+
+def test_index_updated_on_create_edit_and_delete(app):
+    """测试帖子写入时同步维护索引"""
+    post = create_post('flask tips', 'how to use blueprints')
+    results = query_index('blueprints')
+    assert results['帖子内容'][0]['postId'] == post.id
+
+    post.content = 'how to use sqlalchemy'
+    db.session.commit()
+    assert '帖子内容' not in query_index('blueprints')
+    assert query_index('sqlalchemy')['帖子内容'][0]['postId'] == post.id
+
+    post.deleted = True
+    db.session.commit()
+    assert query_index('sqlalchemy') == {}
+
+
+def test_comment_results_point_to_post(app):
+    """测试评论结果同时返回帖子和评论 ID"""
+    post = create_post('hello', 'world')
+    comment = Comment(content='nice answer', html_content='', author_id=1, post_id=post.id)
+    db.session.add(comment)
+    db.session.commit()
+
+    match = query_index('answer')['评论内容'][0]
+    assert match['postId'] == post.id
+    assert match['commentId'] == comment.id
+    assert query_index('alice')['评论作者'][0]['commentId'] == comment.id
+
+
+def test_bm25_ranks_more_relevant_first(app):
+    """测试 BM25 排序"""
+    create_post('python', 'python python python')
+    create_post('misc', 'python and many other unrelated words here')
+    matches = query_index('python')['帖子内容']
+    assert matches[0]['similarity'] >= matches[1]['similarity']
+
+
+def test_rebuild_search_index(app):
+    """测试重建索引"""
+    create_post('first', 'alpha')
+    create_post('second', 'beta')
+    db.session.query(SearchDocument).delete()
+    db.session.commit()
+    assert query_index('alpha') == {}
+
+    assert rebuild_search_index() == 2
+    assert query_index('beta')['帖子内容'][0]['content'] == 'beta'
+
+
+def test_similarity_fallback_for_typos(app):
+    """测试索引未命中时回退到单次遍历的相似度匹配"""
+    post = create_post('blueprint guide', 'how to use flask blueprints')
+    comment = Comment(content='great blueprint', html_content='', author_id=1, post_id=post.id)
+    db.session.add(comment)
+    db.session.commit()
+
+    matches = similarity_matches('blueprnt')
+    assert matches['帖子标题'][0]['matchType'] == 'fuzzy'
+    assert matches['评论内容'][0]['postId'] == post.id
+    assert matches['评论内容'][0]['commentId'] == comment.id
+
+    result = search_logic('blueprnt')
+    assert result['success'] and result['type'] == '内容匹配'
+    similarities = [item['similarity'] for item in result['results']]
+    assert similarities == sorted(similarities, reverse=True)
+
+
+def test_search_cache_invalidated_by_writes(app):
+    """测试搜索缓存命中以及写入后失效"""
+    search_cache.backend = MemoryCacheBackend()
+    post = create_post('cache', 'first version')
+    hits, misses = search_cache.hits, search_cache.misses
+
+    assert search_logic('Version')['success']
+    assert search_logic('  version ')['success']
+    assert (search_cache.hits - hits, search_cache.misses - misses) == (1, 1)
+
+    # 浏览数变化不影响搜索结果
+    post.look_count = 5
+    db.session.commit()
+    assert len(search_cache.backend) == 1
+
+    post.content = 'second edition'
+    db.session.commit()
+    assert len(search_cache.backend) == 0
+    result = search_logic('version')
+    assert all(item['content'] != 'first version' for item in result.get('results', []))
+
+
+@pytest.mark.parametrize('backend_class', [MemoryCacheBackend, SQLiteCacheBackend])
+def test_search_cache_backends_evict(tmp_path, backend_class):
+    """测试缓存后端的容量淘汰和过期"""
+    if backend_class is SQLiteCacheBackend:
+        backend = backend_class(str(tmp_path / 'cache.db'), max_size=2, ttl=60)
+    else:
+        backend = backend_class(max_size=2, ttl=60)
+    backend.set('a', {'n': 1})
+    backend.set('b', {'n': 2})
+    assert backend.get('a') == {'n': 1}
+    backend.set('c', {'n': 3})
+    assert len(backend) == 2
+
+    backend.ttl = -1
+    backend.set('d', {'n': 4})
+    assert backend.get('d') is None
+    backend.clear()
+    assert len(backend) == 0
+
+
+def test_search_pagination_and_stream(app):
+    """测试搜索分页游标和 NDJSON 流式输出"""
+    for i in range(7):
+        create_post(f'paging {i}', f'paging body {i}')
+
+    first = search_logic('paging', limit=5)
+    assert len(first['results']) == 5 and first['total'] == 14
+    assert decode_cursor('paging', first['next_cursor']) == 5
+    with pytest.raises(ValueError):
+        decode_cursor('other', first['next_cursor'])
+
+    second = search_logic('paging', limit=5, offset=decode_cursor('paging', first['next_cursor']))
+    assert second['results'][0] not in first['results']
+
+    last = search_logic('paging', limit=5, offset=10)
+    assert len(last['results']) == 4 and last['next_cursor'] is None
+
+    lines = [json.loads(line) for line in iter_search_ndjson('paging', limit=3)]
+    assert [line['event'] for line in lines] == ['result', 'result', 'result', 'end']
+    assert lines[-1]['next_cursor'] == encode_cursor('paging', 3)
+
+
+def test_prefix_suggestions(app):
+    """测试前缀联想，关键词优先且新帖子提交后立即可见"""
+    db.session.add(SearchModel(keyword='Flask 教程'))
+    db.session.commit()
+    create_post('flask blueprint', 'x')
+    create_post('django', 'y')
+
+    suggester = PrefixSuggester()
+    suggestions = suggester.suggest('FL')
+    assert [item['type'] for item in suggestions] == ['keyword', 'post']
+    assert suggestions[1]['text'] == 'flask blueprint'
+    assert suggester.suggest('zzz') == []
+
+    search_suggester.rebuild()
+    post = create_post('flask testing', 'z')
+    assert any(item.get('postId') == post.id for item in search_suggester.suggest('flask t'))
+
+
+def test_prefix_suggestions_refresh_after_commit_in_background(app):
+    """修改提交后才标记重建，回滚时丢弃；重建在后台进行，完成前返回旧结果"""
+    post = create_post('flask blueprint', 'x')
+    suggester = PrefixSuggester()
+    assert suggester.suggest('flask')[0]['text'] == 'flask blueprint'
+
+    post.title = 'flask testing'
+    db.session.flush()
+    db.session.rollback()
+    assert 'suggest_dirty' not in db.session.info
+
+    post.title = 'flask testing'
+    db.session.flush()
+    assert 'suggest_dirty' in db.session.info
+    db.session.commit()
+    search_suggester.rebuild()
+    assert search_suggester.suggest('flask')[0]['text'] == 'flask testing'
+
+    # 其他进程写入的关键词不会触发本进程的事件，刷新间隔到期后在后台重建
+    suggester.refresh_seconds = 0
+    db.session.execute(SearchModel.__table__.insert().values(keyword='flask 入门'))
+    db.session.commit()
+    assert [item['text'] for item in suggester.suggest('flask')] == ['flask blueprint']
+    suggester._executor.shutdown(wait=True)
+    suggester.refresh_seconds = 60
+    assert [item['text'] for item in suggester.suggest('flask')] == ['flask 入门', 'flask testing']
+
+
+def test_chinese_search_uses_bigrams(app):
+    """测试中文内容按二元组分词后可以命中部分词语"""
+    post = create_post('论坛搜索功能介绍', '本帖介绍 IdeaSphere 的搜索功能')
+    document = SearchDocument.query.filter_by(field='post_title', source_id=post.id).one()
+    assert document.tokens.split()[:2] == ['论坛', '坛搜']
+
+    assert query_index('搜索')['帖子标题'][0]['postId'] == post.id
+    assert query_index('ideasphere 功能')['帖子内容'][0]['postId'] == post.id
+
+
+def test_single_chinese_character_matches_bigram_prefix(app):
+    """测试单个汉字按前缀匹配索引中的二元组"""
+    post = create_post('flask 蓝图 教程', 'z')
+    create_post('红色主题', 'z')
+
+    results = query_index('蓝')
+    assert [match['postId'] for match in results['帖子标题']] == [post.id]
+    assert query_index('蓝 flask')['帖子标题'][0]['postId'] == post.id
+    assert query_index('绿') == {}
@@ -0,0 +1,72 @@
+import pytest
+
+from src.db_ext import db
+from src.functions.database.models import User, Post, Comment, Section
+from src.functions.section.section_counts import reconcile_section_counts
+
+
+@pytest.fixture
+def app(app):
+    db.session.add_all([User(username='alice', password='x', user_uid=1),
+                        Section(name='综合', post_count=0, comment_count=0),
+                        Section(name='技术', post_count=0, comment_count=0)])
+    db.session.commit()
+    return app
+
+
+def add_post(section_id, comments=0):
+    post = Post(title='标题', content='正文', html_content='<p>正文</p>', author_id=1, section_id=section_id)
+    db.session.add(post)
+    db.session.flush()
+    for _ in range(comments):
+        db.session.add(Comment(content='回复', html_content='<p>回复</p>', author_id=1, post_id=post.id))
+    db.session.commit()
+    return post.id
+
+
+def counts():
+    db.session.expire_all()
+    return [(section.post_count, section.comment_count) for section in Section.query.order_by(Section.id)]
+
+
+def expected_counts():
+    reconcile_section_counts()
+    return counts()
+
+
+def test_counters_follow_writes(app):
+    first = add_post(1, comments=2)
+    add_post(1, comments=1)
+    moved = add_post(2, comments=3)
+    assert counts() == expected_counts() == [(2, 3), (1, 3)]
+
+    # 软删除、恢复和移动板块
+    db.session.get(Post, first).deleted = True
+    db.session.commit()
+    assert counts() == [(1, 1), (1, 3)]
+    db.session.get(Post, first).deleted = False
+    db.session.get(Post, moved).section_id = 1
+    db.session.commit()
+    assert counts() == expected_counts() == [(3, 6), (0, 0)]
+
+    # 删除评论和帖子
+    db.session.delete(Comment.query.filter_by(post_id=first).first())
+    db.session.commit()
+    db.session.delete(db.session.get(Post, moved))
+    db.session.commit()
+    assert counts() == [(2, 2), (0, 0)]
+
+
+def test_reconcile_fixes_drift(app):
+    add_post(2, comments=2)
+    db.session.execute(db.update(Section).values(post_count=99, comment_count=99))
+    db.session.commit()
+    assert expected_counts() == [(0, 0), (1, 2)]
+
+
+def test_rollback_discards_counter_updates(app):
+    add_post(1, comments=1)
+    db.session.add(Post(title='草稿', content='正文', html_content='<p>正文</p>', author_id=1, section_id=1))
+    db.session.flush()
+    db.session.rollback()
+    assert counts() == [(1, 1), (0, 0)]
@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import select, func
+
+from src.db_ext import db
+from src.functions.database.models import User, Post, Comment, Section, Like, Report, ReplyComment, \
+    SearchDocument, SectionDailyStat, SectionAuthorDailyStat
+from src.functions.section.section_delete import remove_section
+from src.functions.service.forum_stats import forum_stats
+from src.functions.service.search_suggest import search_suggester
+
+
+@pytest.fixture
+def app(app):
+    """两个板块各 7 篇帖子，每篇帖子带评论、楼中楼回复、点赞和举报"""
+    db.session.add_all([User(username='alice', password='x', user_uid=1),
+                        Section(name='综合', post_count=0, comment_count=0),
+                        Section(name='技术', post_count=0, comment_count=0)])
+    db.session.commit()
+    for i in range(14):
+        post = Post(title=f'帖子 {i}', content='正文', html_content='<p>正文</p>', author_id=1,
+                    section_id=i % 2 + 1)
+        db.session.add(post)
+        db.session.flush()
+        comment = Comment(content='回复', html_content='<p>回复</p>', author_id=1, post_id=post.id)
+        db.session.add(comment)
+        db.session.flush()
+        db.session.add_all([
+            ReplyComment(reply_message='楼中楼', reply_user='alice', target_comment_id=comment.id),
+            Like(user_id=1, post_id=post.id),
+            Like(user_id=1, comment_id=comment.id),
+            Report(post_id=post.id, user_id=1, reason='spam'),
+            Report(comment_id=comment.id, user_id=1, reason='spam')
+        ])
+    db.session.commit()
+    forum_stats.invalidate()
+    search_suggester.rebuild()
+    yield app
+    forum_stats.invalidate()
+
+
+def count(model, *criteria):
+    return db.session.execute(select(func.count()).select_from(model).where(*criteria)).scalar()
+
+
+def test_remove_section_deletes_dependents_in_batches(app):
+    assert forum_stats.get()['topics'] == 14
+    assert len(search_suggester.suggest('帖子', limit=20)) == 14
+    progress = []
+    assert remove_section(1, batch_size=3, log=progress.append) == (7, 7)
+    assert len(progress) == 3
+
+    remaining_posts = select(Post.id)
+    remaining_comments = select(Comment.id)
+    assert count(Section) == 1 and count(Post) == 7 and count(Comment) == 7
+    assert count(Post, Post.section_id == 1) == 0
+    assert count(ReplyComment) == count(ReplyComment, ReplyComment.target_comment_id.in_(remaining_comments)) == 7
+    assert count(Like) == 14
+    assert count(Like, Like.post_id.in_(remaining_posts)) + count(Like, Like.comment_id.in_(remaining_comments)) == 14
+    assert count(Report) == 14
+    assert count(SearchDocument, SearchDocument.post_id.notin_(remaining_posts)) == 0
+    assert count(SectionDailyStat, SectionDailyStat.section_id == 1) == 0
+    assert count(SectionAuthorDailyStat, SectionAuthorDailyStat.section_id == 1) == 0
+
+    assert forum_stats.get()['topics'] == 7
+    assert forum_stats.get()['messages'] == 7
+    # 联想中不再出现已删除帖子的标题
+    assert search_suggester.dirty
+    search_suggester.rebuild()
+    suggestions = search_suggester.suggest('帖子', limit=20)
+    assert len(suggestions) == 7
+    assert {suggestion['postId'] for suggestion in suggestions} == set(db.session.execute(select(Post.id)).scalars())
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from src.db_ext import db
+from src.functions.database.models import User, Post, Comment, Section, SectionDailyStat, SectionAuthorDailyStat
+from src.functions.section.section_stats import rebuild_daily_stats, section_activity, activity_trend, top_authors
+
+NOW = datetime.utcnow().replace(hour=12)
+
+
+@pytest.fixture
+def app(app):
+    db.session.add_all([User(username='alice', password='x', user_uid=1),
+                        User(username='bob', password='x', user_uid=2),
+                        Section(name='综合'), Section(name='技术')])
+    db.session.commit()
+    return app
+
+
+def add_post(section_id, author_id, days_ago=0, comments=()):
+    post = Post(title='标题', content='正文', html_content='<p>正文</p>', author_id=author_id,
+                section_id=section_id, created_at=NOW - timedelta(days=days_ago))
+    db.session.add(post)
+    db.session.flush()
+    for comment_author, comment_days_ago in comments:
+        db.session.add(Comment(content='回复', html_content='<p>回复</p>', author_id=comment_author, post_id=post.id,
+                               created_at=NOW - timedelta(days=comment_days_ago)))
+    db.session.commit()
+    return post.id
+
+
+def rollup():
+    rows = db.session.execute(select(SectionDailyStat.section_id, SectionDailyStat.day, SectionDailyStat.post_count,
+                                     SectionDailyStat.comment_count, SectionDailyStat.author_count)).all()
+    authors = db.session.execute(select(SectionAuthorDailyStat.section_id, SectionAuthorDailyStat.day,
+                                        SectionAuthorDailyStat.author_id, SectionAuthorDailyStat.post_count,
+                                        SectionAuthorDailyStat.comment_count)).all()
+    return sorted(rows), sorted(authors)
+
+
+def assert_matches_rebuild():
+    incremental = rollup()
+    rebuild_daily_stats()
+    assert rollup() == incremental
+    return incremental
+
+
+def test_incremental_rollup_matches_rebuild(app):
+    first = add_post(1, 1, days_ago=3, comments=[(2, 3), (2, 1), (1, 0)])
+    add_post(1, 2, days_ago=1, comments=[(1, 1)])
+    other = add_post(2, 1, days_ago=0, comments=[(2, 0)])
+    daily, _ = assert_matches_rebuild()
+    today = NOW.date()
+    assert (1, today - timedelta(days=1), 1, 2, 2) in daily
+
+    db.session.get(Post, first).deleted = True
+    db.session.commit()
+    assert_matches_rebuild()
+    db.session.get(Post, first).deleted = False
+    db.session.get(Post, other).section_id = 1
+    db.session.commit()
+    assert_matches_rebuild()
+
+    db.session.delete(Comment.query.filter_by(post_id=first).first())
+    db.session.commit()
+    db.session.delete(db.session.get(Post, other))
+    db.session.commit()
+    assert_matches_rebuild()
+
+
+def test_partial_rebuild_keeps_other_days(app):
+    add_post(1, 1, days_ago=10)
+    add_post(1, 2, days_ago=0)
+    before = rollup()
+    rebuild_daily_stats(start=NOW.date() - timedelta(days=2))
+    assert rollup() == before
+
+
+def test_analytics_queries_independent_of_sections_and_range(app, count_statements):
+    for i in range(6):
+        db.session.add(Section(name=f'板块 {i}'))
+    db.session.commit()
+    add_post(1, 1, days_ago=0, comments=[(2, 0)])
+    add_post(1, 1, days_ago=40)
+    add_post(2, 2, days_ago=200)
+    add_post(2, 2, days_ago=500)
+
+    def load(days):
+        start = end - timedelta(days=days - 1)
+        return section_activity(start, end), activity_trend(start, end), top_authors(start, end)
+
+    end = NOW.date()
+    assert count_statements(lambda: load(7))[0] == 3
+    statements, (activity, trend, authors) = count_statements(lambda: load(365))
+    assert statements == 3
+
+    assert [(row['name'], row['post_count'], row['author_count']) for row in activity[:2]] == [('综合', 2, 2),
+                                                                                             ('技术', 1, 1)]
+    assert len(activity) == 8
+    assert len(trend) in (12, 13) and sum(bucket['count'] for bucket in trend) == 3
+    assert authors[1] == [{'username': 'alice', 'post_count': 2, 'comment_count': 0}]
+
+    week = activity_trend(end - timedelta(days=6), end)
+    assert [bucket['count'] for bucket in week] == [0, 0, 0, 0, 0, 0, 1]
+
+    # 不指定日期范围时统计全部历史
+    assert [(row['name'], row['post_count']) for row in section_activity()[:2]] == [('综合', 2), ('技术', 2)]
+    assert top_authors()[2] == [{'username': 'bob', 'post_count': 2, 'comment_count': 0}]
@@ -0,0 +1,64 @@
+import pytest
+from flask import g
+
+from src.db_ext import db
+from src.functions.database.models import User
+from src.functions.service.user_cache import user_cache, force_db_user
+
+
+@pytest.fixture
+def app(app):
+    with app.test_request_context():
+        db.session.add_all([User(username='alice', password='x', user_uid=1, role='user'),
+                            User(username='bob', password='x', user_uid=2, role='user')])
+        db.session.commit()
+        user_cache.configure({'max_size': 1024, 'ttl': 60})
+        yield app
+    user_cache.clear()
+
+
+def test_cached_snapshot_skips_select(app, count_statements):
+    loaded, user = count_statements(lambda: user_cache.get(1))
+    assert loaded == 1 and (user.id, user.user_uid, user.username, user.role) == (1, 1, 'alice', 'user')
+    cached, user = count_statements(lambda: user_cache.get(1))
+    assert cached == 0 and user.username == 'alice' and repr(user) == '<User 1>'
+    assert user_cache.get(99) is None
+
+
+def test_proxy_loads_real_user_lazily(app):
+    user = user_cache.get(1)
+    user.following.append(db.session.get(User, 2))
+    db.session.commit()
+    assert [followed.username for followed in db.session.get(User, 1).following] == ['bob']
+
+
+def test_role_change_and_delete_invalidate(app):
+    assert user_cache.get(2).role == 'user'
+    db.session.get(User, 2).role = 'moderator'
+    db.session.commit()
+    assert user_cache.get(2).role == 'moderator'
+
+    db.session.delete(db.session.get(User, 2))
+    db.session.commit()
+    assert user_cache.get(2) is None
+
+
+def test_lru_bound(app, count_statements):
+    user_cache.configure({'max_size': 1, 'ttl': 60})
+    user_cache.get(1)
+    user_cache.get(2)
+    assert count_statements(lambda: user_cache.get(1))[0] == 1
+
+
+def test_force_db_user_reads_current_role(app):
+    g.user = user_cache.get(1)
+    g.role = g.user.role
+    # 其他进程修改了角色，本进程缓存尚未过期
+    db.session.execute(db.update(User).where(User.id == 1).values(role='admin'))
+    db.session.commit()
+    assert user_cache.get(1).role == 'user'
+
+    view = force_db_user(lambda: g.role)
+    assert view() == 'admin'
+    assert isinstance(g.user, User)
+    assert user_cache.get(1).role == 'admin'